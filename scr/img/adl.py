@@ -0,0 +1,310 @@
+# async media downloader for the imageboard scrappers
+# one shared httpx pool + one global queue, connections capped per host,
+# big files split into byte ranges that share the same per-host cap,
+# md5 (when the board gives one) hashed while the bytes are written
+
+import asyncio
+import contextlib
+import hashlib
+import os
+from pathlib import Path
+from urllib.parse import urlparse
+
+import httpx
+from loguru import logger as log
+
+import cas
+import net
+import stats
+
+TRIES = 5
+CHUNK = 1 << 16
+SEGMENT_MIN = 16 << 20  # bigger files are fetched as parallel byte ranges
+SEGMENT = 4 << 20
+VERIFY_TRIES = 3  # md5 mismatch => back to the queue, this many times in all
+
+
+class Mismatch(Exception):
+    pass
+
+
+class RangeIgnored(Exception):  # 200 to a Range request => whole file instead
+    pass
+
+
+def set_mtime(path, headers):  # aria2c --remote-time=true
+    ts = net.mtime(headers)
+    if ts is not None:
+        os.utime(path, (ts, ts))
+
+
+def save(path, r):  # already fetched response (thread json) => file
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(r.content)
+    set_mtime(path, r.headers)
+
+
+def _hash_tail(h, path, start):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while chunk := f.read(CHUNK):
+            h.update(chunk)
+
+
+async def _check(path, md5):  # file already on disk => Mismatch once removed
+    h = hashlib.md5()
+    await asyncio.to_thread(_hash_tail, h, path, 0)
+    if h.hexdigest() != md5.lower():
+        stats.add("media_verify_total", result="mismatch")
+        path.unlink(missing_ok=True)
+        raise Mismatch(f"md5 {h.hexdigest()} != {md5.lower()} (on disk)")
+    stats.add("media_verify_total", result="ok")
+
+
+class Downloader:
+    def __init__(
+        self,
+        workers=8,
+        per_host=2,
+        queue_size=512,
+        proxy=None,
+        cache=None,
+        limiter=None,
+    ):
+        self.workers = workers
+        self.cache = cache  # cache.Cache for get(), media is never cached
+        self.limiter = limiter  # rl.Limiter, every request takes a host token
+        self.per_host = per_host
+        self.queue = asyncio.Queue(queue_size)
+        self.hosts = {}
+        self.tasks = []
+        self.inflight = {}  # blob => download task, one fetch per hash
+        self.done = self.linked = self.failed = 0
+        self.client = net.async_client(
+            proxy=proxy, limits=httpx.Limits(max_connections=workers + 4)
+        )
+
+    async def __aenter__(self):
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.queue.join()
+        for t in self.tasks:
+            t.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.client.aclose()
+        log.info(f"dl: {self.done} ok, {self.linked} linked, {self.failed} failed")
+
+    def _slot(self, url):
+        host = urlparse(url).hostname
+        if host not in self.hosts:
+            self.hosts[host] = asyncio.Semaphore(self.per_host)
+        return self.hosts[host]
+
+    async def get(self, url):
+        # metadata (catalog / thread json), same pool but no host slot,
+        # so the next thread is fetched while media is still transferring
+        for attempt in range(TRIES):
+            r = None
+            try:
+                offline = self.cache and self.cache.offline
+                if self.limiter and not offline:
+                    await self.limiter.acquire(url)
+                if self.cache:
+                    r = await self.cache.aget(self.client.get, url)
+                else:
+                    r = await self.client.get(url)
+                if self.limiter and not offline:
+                    self.limiter.feedback(url, r)
+                # from disk (hit, or the 504 of an offline miss) => nothing to retry
+                if getattr(r, "from_cache", False) or r.status_code not in net.RETRY:
+                    return r
+                log.warning(f"{url} => {r.status_code}")
+            except httpx.TransportError as e:
+                log.warning(f"{url} => {e!r}")
+            await asyncio.sleep(net.backoff(attempt, r))
+        log.error(f"failed {url} after {TRIES} tries")
+        return r
+
+    async def put(self, url, path, on_done=None, blob=None, md5=None, on_end=None):
+        # on_done() is called once the file is on disk (fetched or already there)
+        # blob => cas.Store path, fetched only if missing and hardlinked to path
+        # md5 => expected hex digest, a fetched file that doesn't match is requeued
+        # on_end() after the last try either way, ok or failed
+        await self.queue.put((url, Path(path), on_done, blob, md5, on_end, 1))
+
+    def _requeue(self, item):
+        # worker can't await a full queue (all workers may be doing the same),
+        # the put runs as its own task and the old item counts as unfinished
+        # until the new one is in => queue.join() never sees a gap
+        task = asyncio.create_task(self.queue.put(item))
+        task.add_done_callback(lambda _: self.queue.task_done())
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            url, path, on_done, blob, md5, on_end, attempt = item
+            requeued = False
+            try:
+                with stats.timer("media", host=urlparse(url).hostname):
+                    if blob:
+                        await self._link(url, path, blob, md5)
+                    else:
+                        await self._fetch(url, path, md5)
+                if on_done:
+                    on_done()
+            except Mismatch as e:
+                if attempt < VERIFY_TRIES:
+                    log.warning(f"{url} => {e}, requeued")
+                    self._requeue((*item[:-1], attempt + 1))
+                    requeued = True
+                else:
+                    self.failed += 1
+                    stats.add("media_files_total", result="failed")
+                    log.error(f"{url} => {e}")
+            except Exception as e:
+                self.failed += 1
+                stats.add("media_files_total", result="failed")
+                log.error(f"{url} => {e!r}")
+            finally:
+                if not requeued:
+                    if on_end:
+                        on_end()
+                    self.queue.task_done()
+
+    async def _link(self, url, path, blob, md5=None):
+        if path.exists():
+            if md5:
+                shared = blob.exists() and os.path.samefile(path, blob)
+                try:
+                    await _check(path, md5)
+                except Mismatch:  # a bad blob goes too => refetched on the requeue
+                    if shared:
+                        blob.unlink(missing_ok=True)
+                    raise
+            return
+
+        if not blob.exists() and blob not in self.inflight:
+            task = asyncio.create_task(self._fetch(url, blob, md5))
+            task.add_done_callback(lambda _: self.inflight.pop(blob, None))
+            self.inflight[blob] = task
+
+        if blob in self.inflight:
+            await asyncio.shield(self.inflight[blob])
+        else:
+            self.linked += 1
+            stats.add("media_files_total", result="linked")
+
+        cas.link(blob, path)
+
+    @contextlib.asynccontextmanager
+    async def _stream(self, url, headers=None):  # one GET, limiter + errors
+        if self.limiter:
+            await self.limiter.acquire(url)
+        async with self.client.stream("GET", url, headers=headers) as r:
+            if self.limiter:
+                self.limiter.feedback(url, r)
+            r.raise_for_status()
+            yield r
+
+    async def _retry(self, url, attempt_fn):
+        # 5xx / 429 / network errors => try again, 4xx goes up
+        for attempt in range(TRIES):
+            try:
+                return await attempt_fn()
+            except httpx.HTTPStatusError as e:
+                code = e.response.status_code
+                if code < 500 and code != 429:
+                    raise
+                log.warning(f"{url} => {code}")
+            except httpx.TransportError as e:
+                log.warning(f"{url} => {e!r}")
+            await asyncio.sleep(net.backoff(attempt))
+        raise Exception(f"failed after {TRIES} tries")
+
+    async def _fetch(self, url, path, md5=None):
+        if path.exists():  # aria2c --auto-file-renaming=false
+            if md5:  # left by an older run / other tool, checked before it counts
+                await _check(path, md5)
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        part = path.with_name(path.name + ".part")
+
+        # big file + byte ranges served => keep only the first segment of
+        # this response, the rest is fetched as parallel ranges below
+        async def whole(split=True):
+            h = hashlib.md5() if md5 else None
+            async with self._stream(url) as r:
+                size = int(r.headers.get("Content-Length", 0))
+                if size < SEGMENT_MIN or r.headers.get("Accept-Ranges") != "bytes":
+                    size = 0
+                if not split:
+                    size = 0
+                with open(part, "wb") as f:
+                    async for chunk in r.aiter_bytes(CHUNK):
+                        f.write(chunk)
+                        if h:
+                            h.update(chunk)
+                        if size and f.tell() >= SEGMENT:
+                            break
+                    return r.headers, size, f.tell(), h
+
+        try:
+            async with self._slot(url):
+                headers, size, start, h = await self._retry(url, whole)
+            if size and not await self._segments(url, part, size, start):
+                # ranges announced but not served => .part + md5 from scratch
+                async with self._slot(url):
+                    headers, _, _, h = await self._retry(url, lambda: whole(False))
+            elif size and h:  # ranges land out of order, the rest is read back once
+                await asyncio.to_thread(_hash_tail, h, part, start)
+            if h and h.hexdigest() != md5.lower():
+                stats.add("media_verify_total", result="mismatch")
+                raise Mismatch(f"md5 {h.hexdigest()} != {md5.lower()}")
+        except BaseException:
+            part.unlink(missing_ok=True)
+            raise
+
+        if h:
+            stats.add("media_verify_total", result="ok")
+
+        os.replace(part, path)
+        set_mtime(path, headers)
+        self.done += 1
+        stats.add("media_files_total", result="ok")
+
+    async def _segments(self, url, part, size, start):  # => False: ranges ignored
+        # every range takes its own host slot => per-host cap still holds
+        with open(part, "r+b") as f:
+            f.truncate(size)
+
+        async def segment(a, b):
+            async def one():
+                headers = {"Range": f"bytes={a}-{b}"}
+                async with self._stream(url, headers) as r:
+                    if r.status_code != 206:
+                        raise RangeIgnored(r.status_code)
+                    with open(part, "r+b") as f:
+                        f.seek(a)
+                        async for chunk in r.aiter_bytes(CHUNK):
+                            f.write(chunk)
+                        if f.tell() != b + 1:
+                            raise httpx.ReadError(f"short range {a}-{b}")
+
+            async with self._slot(url):
+                await self._retry(url, one)
+
+        log.trace(f"{url} => {size / 1024 / 1024:.1f} MB in segments")
+        served = True
+        try:
+            async with asyncio.TaskGroup() as tg:  # one range failed => all cancelled
+                for a in range(start, size, SEGMENT):
+                    tg.create_task(segment(a, min(a + SEGMENT, size) - 1))
+        except* RangeIgnored as e:
+            log.warning(f"{url} => range ignored ({e.exceptions[0]}), whole file")
+            served = False
+        return served
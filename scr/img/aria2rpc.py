@@ -0,0 +1,171 @@
+# one long-lived aria2c (rpc on localhost) for every batch of a run
+# add() returns at once, a poller thread reports each download once it stops,
+# so --max-concurrent-downloads holds across batches instead of per input file
+
+import os
+import secrets
+import shutil
+import socket
+import subprocess
+import threading
+import time
+
+import requests
+from loguru import logger as log
+
+import stats
+
+POLL = 0.5  # seconds between tellStopped
+START_TIMEOUT = 10
+
+# what the scrappers passed to every aria2c batch
+OPTIONS = {
+    "max-connection-per-server": 2,
+    "max-concurrent-downloads": 5,
+    "auto-file-renaming": "false",
+    "remote-time": "true",
+    "file-allocation": "none",
+    "continue": "true",
+}
+KEYS = ["gid", "status", "errorCode", "errorMessage", "totalLength", "files"]
+
+
+def available():
+    if shutil.which("aria2c") is None:
+        return False
+
+    try:
+        r = subprocess.run(
+            ["aria2c", "--version"], capture_output=True, text=True, check=True
+        )
+        return "aria2" in r.stdout.lower()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return False
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Aria2:
+    def __init__(self, options=None, proxy=None):
+        port = free_port()
+        self.secret = secrets.token_hex(16)
+        self.url = f"http://127.0.0.1:{port}/jsonrpc"
+        self.session = requests.Session()
+        self.session.trust_env = False  # never send rpc through a proxy
+
+        args = [
+            "aria2c",
+            "--enable-rpc=true",
+            "--rpc-listen-all=false",
+            f"--rpc-listen-port={port}",
+            f"--rpc-secret={self.secret}",
+            f"--stop-with-process={os.getpid()}",  # no orphan daemons
+            "--log-level=error",
+            "--console-log-level=error",
+            "--download-result=hide",
+            "--summary-interval=0",
+            "--quiet=true",
+        ]
+        args += [f"--{k}={v}" for k, v in {**OPTIONS, **(options or {})}.items()]
+        if proxy:
+            args.append(f"--all-proxy={proxy}")
+        t = time.perf_counter()
+        self.proc = subprocess.Popen(args)
+
+        self.pending = {}  # gid => on_done(status) | None
+        self.lock = threading.Condition()
+        self.ok = self.failed = 0
+        self.closed = False
+
+        deadline = time.monotonic() + START_TIMEOUT
+        while True:
+            try:
+                self.call("getVersion")
+                break
+            except requests.ConnectionError:
+                if time.monotonic() > deadline or self.proc.poll() is not None:
+                    raise OSError("aria2c rpc did not come up")
+                time.sleep(0.1)
+
+        stats.observe("aria2_start_seconds", time.perf_counter() - t)
+
+        self.poller = threading.Thread(target=self._poll, daemon=True)
+        self.poller.start()
+
+    def call(self, method, *params):
+        body = {
+            "jsonrpc": "2.0",
+            "id": method,
+            "method": f"aria2.{method}",
+            "params": [f"token:{self.secret}", *params],
+        }
+        ret = self.session.post(self.url, json=body, timeout=30).json()
+        if "error" in ret:
+            raise OSError(f"aria2.{method}: {ret['error']['message']}")
+        return ret["result"]
+
+    def add(self, url, dir, out, on_done=None, checksum=None):
+        # => gid, on_done(status dict) from the poller thread once it stops
+        # checksum => "md5=<hex>", aria2c fails it with errorCode 32 on mismatch
+        options = {"dir": str(dir), "out": str(out)}
+        if checksum:
+            options["checksum"] = checksum
+        with self.lock:
+            gid = self.call("addUri", [url], options)
+            self.pending[gid] = on_done
+        return gid
+
+    def _poll(self):
+        while not self.closed:
+            time.sleep(POLL)
+            with self.lock:
+                if not self.pending:
+                    continue
+            try:
+                stopped = self.call("tellStopped", 0, 1000, KEYS)
+            except (requests.RequestException, OSError) as e:
+                log.warning(f"aria2 => {e!r}")
+                continue
+
+            for s in stopped:
+                with self.lock:
+                    if s["gid"] not in self.pending:
+                        continue
+                    on_done = self.pending.pop(s["gid"])
+                try:
+                    self.call("removeDownloadResult", s["gid"])
+                except (requests.RequestException, OSError):
+                    pass
+
+                stats.add("aria2_downloads_total", status=s["status"])
+                if s["status"] == "complete":
+                    self.ok += 1
+                else:
+                    self.failed += 1
+                    uri = s["files"][0]["uris"][0]["uri"] if s.get("files") else "?"
+                    log.error(f"{uri} => {s.get('errorMessage', s['status'])}")
+
+                if on_done:
+                    try:
+                        on_done(s)
+                    except Exception as e:
+                        log.error(f"aria2 on_done => {e!r}")
+
+            with self.lock:
+                if not self.pending:
+                    self.lock.notify_all()
+
+    def join(self):  # every download added so far has stopped
+        with self.lock:
+            while self.pending:
+                self.lock.wait()
+
+    def close(self):  # join() first if anything is left
+        self.closed = True
+        self.proc.terminate()  # rpc shutdown lingers for seconds
+        self.proc.wait()
+        log.info(f"aria2: {self.ok} ok, {self.failed} failed")
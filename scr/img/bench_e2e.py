@@ -0,0 +1,180 @@
+#!/usr/bin/env -S uv run --script
+
+# /// script
+# dependencies = []  # stdlib + mockboard.py, scrappers bring their own
+# ///
+
+# every scrapper end to end against mockboard.py: wall time, requests, bytes
+# each one runs as its own process in a fresh temp dir (no http cache, no index),
+# so the numbers cover the whole path: pages => parse => media on disk
+# heyuri / iiyakuji keep their rl.Limiter, their wall time is mostly the pacing
+# scrappers start through uv run --script => the deps of their own script block,
+# without uv on PATH they share this interpreter (deps installed by hand)
+#
+#   bench_e2e.py                           generated fixtures, no injection
+#   bench_e2e.py -l 50 -J 50 -b 4096       50-100 ms latency, 4 MB/s per conn
+#   bench_e2e.py -e 0.05 vichan futaba     5% 503s, only these two
+#   bench_e2e.py -o before.json  /  -c before.json   save / compare runs
+
+import json
+import optparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import mockboard
+
+HERE = Path(__file__).resolve().parent
+UV = shutil.which("uv")
+
+# name => argv after the script, {} => mock base url
+RUNS = {
+    "vichan": ["vichan.py", "-d", "", "0-9", "{}/vichan/b"],
+    "lynxchan": ["lynxchan.py", "-d", "", "0-9", "{}/lynxchan/t"],
+    "futaba": ["futaba.py", "{}/futaba/b/futaba.htm"],
+    "heyuri": ["heyuri.py", "0-9", "{}/heyuri/b/"],
+    "iiyakuji": ["iiyakuji.py", "0-10", "{}/azu"],
+    "nendroid": ["nendroid.py", "{}/2008-03/"],
+}
+
+
+def fetch(url):
+    with urllib.request.urlopen(url) as r:
+        return json.loads(r.read() or b"{}")
+
+
+def files(root):
+    n = size = 0
+    for p in Path(root).rglob("*"):
+        if p.is_file() and p.suffix not in (
+            ".db",
+            ".json",
+            ".txt",
+            ".html",
+            ".htm",
+            ".md5",
+        ):
+            n += 1
+            size += p.stat().st_size
+    return n, size
+
+
+def client_stats(path):  # STATS_OUT of the run => requests, retried
+    try:
+        snap = json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return 0, 0
+    req = retried = 0
+    for c in snap["counters"]:
+        if c["name"] == "http_requests_total":
+            req += c["value"]
+            if int(c["labels"].get("status", 0)) in (429, 503):
+                retried += c["value"]
+    return req, retried
+
+
+def run(name, base, timeout):
+    fetch(f"{base}/_reset")
+    env = {
+        **os.environ,
+        "HTTP_CACHE": "",
+        "STATS_OUT": "stats.json",
+        "NO_PROXY": "127.0.0.1,localhost",
+    }
+    for k in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "http_proxy", "https_proxy"):
+        env.pop(k, None)
+
+    script, *args = RUNS[name]
+    run = [UV, "run", "--script"] if UV else [sys.executable]
+    argv = run + [str(HERE / script)] + [a.format(base) for a in args]
+
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as tmp:
+        t = time.perf_counter()
+        try:
+            p = subprocess.run(
+                argv,
+                cwd=tmp,
+                env=env,
+                timeout=timeout,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+            code = p.returncode
+        except subprocess.TimeoutExpired:
+            code = "timeout"
+        wall = time.perf_counter() - t
+
+        server = fetch(f"{base}/_stats").get(name, {})
+        n, size = files(tmp)
+        req, retried = client_stats(Path(tmp) / "stats.json")
+
+    if code not in (0, "timeout"):
+        print(p.stderr[-2000:], file=sys.stderr)
+
+    return {
+        "wall": wall,
+        "requests": server.get("requests", 0),
+        "bytes": server.get("bytes", 0),
+        "client_requests": req,
+        "retried": retried,
+        "files": n,
+        "stored": size,
+        "exit": code,
+    }
+
+
+def table(results, before=None):
+    print(
+        f"{'scrapper':<10} {'wall s':>8} {'req':>6} {'MB':>8} {'MB/s':>7} "
+        f"{'req/s':>7} {'files':>6} {'retry':>6} {'exit':>7}"
+    )
+    for name, r in results.items():
+        mb = r["bytes"] / 1024 / 1024
+        line = (
+            f"{name:<10} {r['wall']:>8.2f} {r['requests']:>6} {mb:>8.1f} "
+            f"{mb / r['wall']:>7.2f} {r['requests'] / r['wall']:>7.1f} "
+            f"{r['files']:>6} {r['retried']:>6} {r['exit']!s:>7}"
+        )
+        if before and name in before:
+            line += f"  {before[name]['wall'] / r['wall']:.2f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser(usage="%prog [options] [scrapper ...]")
+    mockboard.options(parser)
+    parser.set_defaults(dir=None, port=0)
+    parser.add_option("-T", dest="timeout", type=int, default=600, help="per run, s")
+    parser.add_option("-o", dest="out", default=None, help="save results (json)")
+    parser.add_option("-c", dest="compare", default=None, help="compare with saved")
+    o, names = parser.parse_args()
+
+    for name in names:
+        if name not in RUNS:
+            parser.error(f"{name}: unknown, use {' '.join(RUNS)}")
+
+    # fixtures carry absolute //host links (heyuri) => bind first, then generate
+    tmp = None
+    if not o.dir:
+        tmp = tempfile.TemporaryDirectory(prefix="mockboard-")
+        o.dir, o.gen = tmp.name, True
+    server = mockboard.serve(o.dir, o.port)
+    o.port = server.server_port
+    mockboard.setup(o)
+    base = f"http://127.0.0.1:{o.port}"
+
+    results = {name: run(name, base, o.timeout) for name in names or RUNS}
+    before = json.loads(Path(o.compare).read_text()) if o.compare else None
+    table(results, before)
+
+    if o.out:
+        Path(o.out).write_text(json.dumps(results, indent=1))
+    server.shutdown()
+    if tmp:
+        tmp.cleanup()
@@ -0,0 +1,156 @@
+#!/usr/bin/env -S uv run --script
+
+# /// script
+# dependencies = [
+#   "httpx",
+#   "bs4",
+#   "lxml",
+#   "loguru",
+# ]
+# ///
+
+# links.py backends over recorded pages: same links as bs4? pages/sec?
+#   bench_links.py -r fixtures https://img.heyuri.net/b/ http://ii.yakuji.moe/azu/
+#   bench_links.py -g synth         generated edge cases, no network needed
+#   bench_links.py fixtures synth
+
+import optparse
+import re
+import sys
+import time
+from pathlib import Path
+
+import links
+import net
+
+# what trips a regex tokenizer up, each case is a page of its own (a diff names
+# it) and all of them once more in one big page for the speed numbers
+EDGE = {
+    "comments": """
+<!-- <a href="/commented">no</a> -->
+<a href="/after-comment">1</a><!-- unclosed <a href="/x"> -- > still comment -->
+<a href="/after-tricky">2</a>
+<!---><a href="/empty-comment">3</a><!-- a -- b -->
+""",
+    "script_style": """
+<script>var s = '<a href="/in-script">x</a>';</script>
+<a href="/between">1</a>
+<style>a[href="/in-style"]:after { content: "<a href='/x'>"; }</style>
+<SCRIPT type="text/javascript">document.write("<a href=/js>")</SCRIPT >
+<a href="/after-script">2</a>
+""",
+    "unquoted": """
+<a href=/res/1.html>1</a>
+<a href=/src/2.jpg target=_blank>2</a>
+<a class=x href=thumb/3.png?w=1&h=2>3</a>
+<A HREF=/UPPER.htm>4</A>
+<a href = "/spaced" >5</a>
+<a download href='/single'>6</a>
+""",
+    "duplicate": """
+<a href="/first" href="/second">1</a>
+<a class="a" class="b" href="/cls">2</a>
+<a HREF="/upper" href="/lower">3</a>
+""",
+    "entities": """
+<a href="/src/1.jpg?a=1&amp;b=2">1</a>
+<a href="/&#x30B9;&#12473;.png">2</a>
+<a href="/caf&eacute;&nbsp;x.jpg" title="&lt;b&gt; &quot;q&quot;">3</a>
+<a href=/raw&copy>4</a>
+""",
+    "cdata_pi": """
+<![CDATA[ <a href="/in-cdata">x</a> ]]><a href="/after-cdata">1</a>
+<?php echo '<a href="/in-php">'; ?><a href="/after-php">2</a>
+<?php if ($n > 1) { ?><a href="/php-gt">3</a><?php } ?>
+<?xml version="1.0"?><!DOCTYPE html><! bogus <a href="/in-bogus"> >
+</ <a href="/in-end">4</a><a href="/last">5</a>
+""",
+    "broken": """
+<a href="/no-close">1
+<a href="/nested"><a href="/inner">2</a></a>
+<a
+  href="/newlines"
+  rel="nofollow">3</a>
+<a/href="/slash">4</a><abbr href="/not-a">x</abbr>
+""",
+}
+
+
+def generate(out, copies=200):
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    for name, body in EDGE.items():
+        page = f"<html><body>{body}</body></html>"
+        (out / f"edge_{name}.html").write_text(page, encoding="utf-8")
+    bulk = "".join(EDGE.values()) * copies
+    page = f"<html><body>{bulk}</body></html>"
+    (out / "edge_all.html").write_text(page, encoding="utf-8")
+    print(f"{len(EDGE) + 1} pages => {out}")
+
+
+parser = optparse.OptionParser(usage="%prog [options] <fixtures dir | page.html> ...")
+parser.add_option(
+    "-r", dest="record", default=None, help="save given urls into dir first"
+)
+parser.add_option("-g", dest="generate", default=None, help="write edge cases here")
+parser.add_option("-n", dest="rounds", type=int, default=20, help="rounds per page")
+options, arguments = parser.parse_args()
+
+if options.record:
+    out = Path(options.record)
+    out.mkdir(parents=True, exist_ok=True)
+
+    for url in arguments:
+        r = net.get(url)
+        name = re.sub(r"[^\w.-]+", "_", url.split("://", 1)[-1]).strip("_")
+        (out / f"{name}.html").write_text(r.text, encoding="utf-8")
+        print(f"{url} => {name}.html ({len(r.text)} chars)")
+
+    arguments = [options.record]
+
+if options.generate:
+    generate(options.generate)
+    arguments.append(options.generate)
+
+if not arguments:
+    parser.print_help()
+    sys.exit()
+
+pages = []
+for arg in arguments:
+    p = Path(arg)
+    for f in sorted(p.glob("*.htm*")) if p.is_dir() else [p]:
+        pages.append((f.name, f.read_text(encoding="utf-8", errors="replace")))
+
+if not pages:
+    print("no pages")
+    sys.exit(1)
+
+ref = {name: links.anchors_bs4(text) for name, text in pages}
+total = sum(len(x) for x in ref.values())
+print(f"{len(pages)} pages, {total} links, {options.rounds} rounds\n")
+
+rows = []
+for name, fn in links.BACKENDS.items():
+    try:
+        diff = [page for page, text in pages if fn(text) != ref[page]]
+    except ImportError as e:
+        rows.append((name, f"({e.name} not installed)", 0, []))
+        continue
+
+    t = time.perf_counter()
+    for _ in range(options.rounds):
+        for _, text in pages:
+            fn(text)
+    speed = len(pages) * options.rounds / (time.perf_counter() - t)
+    rows.append((name, "yes" if not diff else "NO", speed, diff))
+
+base = next(speed for name, _, speed, _ in rows if name == "bs4")
+print(f"{'backend':8} {'same':>6} {'pages/s':>10} {'x bs4':>7}")
+for name, same, speed, diff in rows:
+    if not speed:
+        print(f"{name:8} {same}")
+        continue
+    print(f"{name:8} {same:>6} {speed:>10.1f} {speed / base:>7.1f}")
+    for page in diff:
+        print(f"  differs: {page}")
@@ -0,0 +1,120 @@
+# process-wide download budget: every response body read through net.py
+# (sync or async, any thread) takes its bytes from here. sites busy at the
+# moment split the budget by weight, an idle site's share goes to the rest
+#
+#   HTTP_BW=4M                        bytes/sec for the whole process (K/M/G), 0 = off
+#   HTTP_BW_WEIGHTS=wapchan=3,2chan=1 host part => weight, everything else 1
+#   HTTP_BW_FILE=bw.txt               "4M wapchan=3 2chan=1", re-read once it changes,
+#                                     echo 1M > bw.txt slows a running crawl down
+
+import os
+import threading
+import time
+
+from loguru import logger as log
+
+import stats
+
+ACTIVE = 1.0  # a site takes part in the split this long after its last read
+BURST = 0.25  # seconds of its share an idle site may catch up at once
+CHECK = 1.0  # HTTP_BW_FILE mtime, seconds between looks
+UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_rate(s):  # "4M" / "512k" / "100000" => bytes/sec
+    s = str(s or 0).strip().upper().removesuffix("B")
+    return int(float(s[:-1]) * UNITS[s[-1]]) if s[-1:] in UNITS else int(float(s))
+
+
+def parse_weights(s):  # "wapchan=3,2chan=1" => {"wapchan": 3.0, "2chan": 1.0}
+    weights = {}
+    for part in s.replace(",", " ").split():
+        name, _, w = part.partition("=")
+        weights[name] = float(w or 1)
+    return weights
+
+
+def parse(text):  # "4M wapchan=3 2chan=1" => rate, weights
+    rate = None
+    weights = {}
+    for part in text.split():
+        if "=" in part:
+            weights.update(parse_weights(part))
+        else:
+            rate = parse_rate(part)
+    return rate, weights
+
+
+class Shaper:
+    def __init__(self, rate=0, weights=None, path=None):
+        self.rate = rate
+        self.weights = weights or {}
+        self.path = path
+        self.mtime = None
+        self.checked = 0.0
+        self.sites = {}  # site => [reserved until, last read]
+        self.lock = threading.Lock()
+
+    def configure(self, rate=None, weights=None):  # any time, next chunk obeys
+        with self.lock:
+            if rate is not None:
+                self.rate = rate
+            if weights is not None:
+                self.weights = weights
+        log.info(f"bw: {self.rate / 1024 / 1024:.2f} MB/s {self.weights or ''}")
+
+    def _site(self, host):  # hosts matching one weight share it
+        for name in self.weights:
+            if name in host:
+                return name
+        return host
+
+    def _reload(self, now):
+        if not self.path or now - self.checked < CHECK:
+            return
+        self.checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self.mtime:
+                return
+            self.mtime = mtime
+            with open(self.path, encoding="utf-8") as f:
+                rate, weights = parse(f.read())
+        except (OSError, ValueError, KeyError) as e:
+            log.warning(f"bw: {self.path} => {e!r}")
+            return
+        if rate is not None:
+            self.rate = rate
+        self.weights = weights
+        log.info(f"bw: {self.rate / 1024 / 1024:.2f} MB/s {weights or ''}")
+
+    def take(self, host, n):  # => seconds to wait before reading on
+        now = time.monotonic()
+        with self.lock:
+            self._reload(now)
+            if not self.rate:
+                return 0.0
+
+            site = self._site(host or "")
+            s = self.sites.setdefault(site, [now, now])
+            s[1] = now
+            busy = sum(
+                self.weights.get(k, 1)
+                for k, (_, last) in self.sites.items()
+                if now - last < ACTIVE
+            )
+            share = self.rate * self.weights.get(site, 1) / busy
+            s[0] = max(s[0], now - BURST) + n / share
+            delay = s[0] - now
+
+        if delay <= 0:
+            return 0.0
+        stats.add("bw_wait_seconds_total", delay, site=site)
+        return delay
+
+
+SHAPER = Shaper(
+    parse_rate(os.environ.get("HTTP_BW", 0)),
+    parse_weights(os.environ.get("HTTP_BW_WEIGHTS", "")),
+    os.environ.get("HTTP_BW_FILE") or None,
+)
@@ -0,0 +1,220 @@
+# on-disk http cache for catalog / page / thread fetches (not media)
+# bodies + ETag/Last-Modified, every hit is revalidated => mostly 304s on re-runs,
+# lru eviction past MAX_SIZE, offline mode serves whatever is cached
+#
+#   HTTP_CACHE=dir       cache dir (default .http_cache, empty => off)
+#   HTTP_CACHE_MB=512    size limit
+#   HTTP_OFFLINE=1       no network, misses come back as 504
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from loguru import logger as log
+
+import stats
+
+DIR = os.environ.get("HTTP_CACHE", ".http_cache")
+MAX_SIZE = int(os.environ.get("HTTP_CACHE_MB", 512)) * 1024 * 1024
+OFFLINE = os.environ.get("HTTP_OFFLINE", "") not in ("", "0")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY, key TEXT, headers TEXT, encoding TEXT,
+    size INTEGER, atime REAL
+)
+"""
+
+
+class Headers(dict):  # case-insensitive enough for get / in / []
+    def __init__(self, items=()):
+        super().__init__((k.lower(), v) for k, v in dict(items).items())
+
+    def __getitem__(self, k):
+        return super().__getitem__(k.lower())
+
+    def __contains__(self, k):
+        return super().__contains__(k.lower())
+
+    def get(self, k, default=None):
+        return super().get(k.lower(), default)
+
+
+class Cached:
+    # enough of requests.Response / httpx.Response for the scrappers
+    from_cache = True
+
+    def __init__(
+        self, url, status_code, headers, content, encoding=None, not_modified=False
+    ):
+        self.url = url
+        self.status_code = status_code
+        self.headers = Headers(headers)
+        self.content = content
+        self.encoding = encoding  # what the live response decoded .text with
+        self.not_modified = not_modified  # 304 from server, body from disk
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    is_success = ok
+
+    @property
+    def is_error(self):
+        return not self.ok
+
+    def __bool__(self):
+        return self.ok
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise OSError(f"{self.status_code} {self.url}")
+
+
+class Cache:
+    def __init__(self, path=DIR, max_size=MAX_SIZE, offline=OFFLINE):
+        self.path = Path(path).absolute()  # scrappers chdir around
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path / "index.db", check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(SCHEMA)
+        self.size = self.db.execute("SELECT TOTAL(size) FROM entries").fetchone()[0]
+        self.hits = self.misses = 0
+
+    def _body(self, key):
+        return self.path / key[:2] / key
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT key, headers, encoding FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+
+        try:
+            content = self._body(row[0]).read_bytes()
+        except FileNotFoundError:
+            return None
+        return Cached(url, 200, json.loads(row[1]), content, row[2])
+
+    def validators(self, cached):
+        headers = {}
+        if cached and "ETag" in cached.headers:
+            headers["If-None-Match"] = cached.headers["ETag"]
+        if cached and "Last-Modified" in cached.headers:
+            headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+        return headers
+
+    def store(self, url, r):
+        key = hashlib.sha1(url.encode()).hexdigest()
+        body = self._body(key)
+        body.parent.mkdir(exist_ok=True)
+        tmp = body.with_name(key + ".tmp")
+        tmp.write_bytes(r.content)
+        os.replace(tmp, body)
+
+        keep = ("Content-Type", "ETag", "Last-Modified")
+        headers = {k: r.headers[k] for k in keep if k in r.headers}
+
+        with self.lock:
+            old = self.db.execute(
+                "SELECT size FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+            self.size += len(r.content) - (old[0] if old else 0)
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    key,
+                    json.dumps(headers),
+                    r.encoding,
+                    len(r.content),
+                    time.time(),
+                ),
+            )
+            self.db.commit()
+            if self.size > self.max_size:
+                self._evict()
+
+    def touch(self, url):
+        with self.lock:
+            q = "UPDATE entries SET atime = ? WHERE url = ?"
+            self.db.execute(q, (time.time(), url))
+            self.db.commit()
+
+    def _evict(self):  # least recently used first, down to 90%
+        rows = self.db.execute(
+            "SELECT url, key, size FROM entries ORDER BY atime"
+        ).fetchall()
+        for url, key, size in rows:
+            if self.size <= self.max_size * 0.9:
+                break
+            self._body(key).unlink(missing_ok=True)
+            self.db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            self.size -= size
+        self.db.commit()
+        log.trace(f"cache: evicted down to {self.size / 1024 / 1024:.1f} MB")
+
+    def _before(self, url):
+        cached = self.lookup(url)
+        if self.offline:
+            if cached:
+                self.hits += 1
+                stats.add("cache_requests_total", result="hit")
+                return cached, cached
+            self.misses += 1
+            stats.add("cache_requests_total", result="miss")
+            return None, Cached(url, 504, {}, b"")
+        return cached, None
+
+    def _after(self, url, cached, r):
+        if r.status_code == 304 and cached:
+            self.hits += 1
+            stats.add("cache_requests_total", result="hit")
+            self.touch(url)
+            cached.not_modified = True
+            return cached
+
+        self.misses += 1
+        stats.add("cache_requests_total", result="miss")
+        if r.status_code == 200:
+            self.store(url, r)
+        return r
+
+    def get(self, fetch, url, **kwargs):
+        # fetch(url, headers=...) => requests-like response
+        cached, ret = self._before(url)
+        if ret is not None:
+            return ret
+
+        headers = {**kwargs.pop("headers", {}), **self.validators(cached)}
+        return self._after(url, cached, fetch(url, headers=headers, **kwargs))
+
+    async def aget(self, fetch, url, **kwargs):
+        # same, fetch is a coroutine (httpx.AsyncClient.get)
+        cached, ret = self._before(url)
+        if ret is not None:
+            return ret
+
+        headers = {**kwargs.pop("headers", {}), **self.validators(cached)}
+        return self._after(url, cached, await fetch(url, headers=headers, **kwargs))
+
+
+def open_default():  # HTTP_CACHE="" => None, no caching
+    return Cache() if DIR else None
@@ -0,0 +1,46 @@
+# content-addressed store: every blob is written once under
+# <root>/<algo>/<aa>/<digest><ext>, thread files are hardlinks to it
+
+import base64
+import os
+import re
+import shutil
+from pathlib import Path
+
+from loguru import logger as log
+
+
+class Store:
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def blob(self, algo, digest, ext=""):
+        digest = digest.lower()
+        return self.root / algo / digest[:2] / f"{digest}{ext}"
+
+    def vichan(self, md5, ext):  # "GBfYwENYAaBg1C9aoow58A==" (base64)
+        try:
+            digest = base64.b64decode(md5, validate=True).hex()
+        except ValueError:
+            return None
+        return self.blob("md5", digest, ext)
+
+    def lynxchan(self, path):  # /.media/ae3...b4d.jpg (sha256)
+        name = os.path.basename(path)
+        m = re.match(r"([0-9a-fA-F]{64})", name)
+        if not m:
+            return None
+        return self.blob("sha256", m.group(1), os.path.splitext(name)[1])
+
+
+def link(blob, out):
+    out = Path(out)
+    if out.exists():
+        return
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(blob, out)
+    except OSError as e:  # other fs / no hardlinks => plain copy
+        log.warning(f"{out} => {e!r}, copying")
+        shutil.copy2(blob, out)
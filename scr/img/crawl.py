@@ -0,0 +1,379 @@
+#!/usr/bin/env -S uv run --script
+
+# /// script
+# dependencies = [
+#   "httpx",
+#   "requests",
+#   "bs4",
+#   "loguru",
+# ]
+# ///
+
+# one pipeline for every imageboard: boards => threads => media => downloads
+# sites plug in as adapters (vichan.Site, lynxchan.Site, heyuri.Site, ...),
+# stages are worker pools joined by bounded queues, so one run crawls boards
+# of several sites at once and only per-host politeness slows it down
+#
+#   crawl.py 0-5 https://wapchan.org/cel https://hikari3.ch/t https://img.heyuri.net/b/
+#   crawl.py 0-5 vichan:https://example.org/b      (site not guessed from host)
+
+import asyncio
+import contextvars
+import importlib
+import optparse
+import re
+import sys
+from pathlib import Path
+from urllib.parse import urlparse
+
+from loguru import logger as log
+
+import adl
+import bw
+import cache
+import cas
+import index
+import net
+import pack
+import rl
+import stats
+
+THREAD_QUEUE = 256  # threads found but not dumped yet, per run
+MANIFEST = ".md5"  # <thread dir>.md5 next to the dir / tar, md5sum -c format
+PENDING = contextvars.ContextVar("pending", default=None)  # worker => put_thread()
+
+# host part => adapter module
+HOSTS = {
+    "wapchan": "vichan",
+    "lainchan": "vichan",
+    "hikari3": "lynxchan",
+    "heyuri": "heyuri",
+    "yakuji": "iiyakuji",
+    "2chan": "futaba",
+}
+SITES = ("vichan", "lynxchan", "heyuri", "iiyakuji", "futaba")
+
+
+def setup_log(file="log.txt"):
+    log.remove()
+    log.add(
+        sys.stderr,
+        format="<level>[{time:DD-MMM-YYYY HH:mm:ss}]</level> {message}",
+        backtrace=True,
+        diagnose=True,
+        colorize=True,
+        level=5,
+    )
+    if file:
+        log.add(
+            file,
+            format="[{time:DD-MMM-YYYY HH:mm:ss}] {message}",
+            backtrace=True,
+            diagnose=True,
+            colorize=True,
+            level=5,
+        )
+
+
+def str_cut(string, letters, postfix="..."):
+    return string[:letters] + (string[letters:] and postfix)
+
+
+def str_fix(string):
+    return str_cut(re.sub(r'[/\\?%*:{}【】|"<>]', "", string), 200, "")
+
+
+class Pending:
+    # queue item (site, th, on_settled) => on_settled() once dump_thread returned
+    # and every file it put is on disk or failed (daemon.py: no thread twice)
+    def __init__(self, on_settled):
+        self.on_settled = on_settled
+        self.left = 1  # dump_thread itself
+
+    def add(self, n):
+        self.left += n
+
+    def done(self):
+        self.left -= 1
+        if not self.left:
+            self.on_settled()
+
+
+class Crawl:
+    # what adapters get: get() for pages / json, put_thread() for media,
+    # plus the shared index / store / options
+    def __init__(self, options):
+        self.options = options
+        self.index = index.Index(options.index) if options.index else None
+        self.store = cas.Store(options.store) if options.store else None
+        self.pack = pack.Packer() if options.pack else None
+        self.limiter = rl.Limiter(options.rate, options.burst) if options.rate else None
+        if options.bandwidth:
+            bw.SHAPER.configure(bw.parse_rate(options.bandwidth))
+        self.dl = adl.Downloader(
+            options.workers,
+            options.per_host,
+            proxy=options.proxy,
+            cache=cache.open_default(),
+            limiter=self.limiter,
+        )
+        self.aria2 = None  # aria2rpc.Aria2, started in run() with -x
+        self.manifests = {}  # manifest path => names already in it
+        self.queue = asyncio.Queue(THREAD_QUEUE)
+        stats.gauge("thread_queue", self.queue.qsize)
+        stats.gauge("media_queue", self.dl.queue.qsize)
+
+    async def get(self, url):
+        return await self.dl.get(url)
+
+    def save(self, path, r):  # thread json / html next to the media
+        if self.pack:
+            self.pack.add_bytes(path, r.content, net.mtime(r.headers))
+        else:
+            adl.save(path, r)
+
+    def stored(self, f):
+        if self.index and f.get("key") and self.index.has(*f["key"]):
+            return True
+        return bool(self.pack and self.pack.has(f["out"]))
+
+    def verified(self, out, md5):
+        # one "<md5>  <thread dir>/<name>" line per checked file, so an audit is
+        # md5sum -c (or a diff of two manifests) instead of hashing the archive
+        out = Path(out)
+        path = out.parent.with_name(out.parent.name + MANIFEST)
+        if path not in self.manifests:
+            self.manifests[path] = set()
+            if path.is_file():
+                for line in path.read_text(encoding="utf-8").splitlines():
+                    self.manifests[path].add(line.partition("  ")[2])
+
+        name = out.as_posix()
+        if name in self.manifests[path]:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(f"{md5}  {name}\n")
+        self.manifests[path].add(name)
+
+    async def put_thread(self, files, on_thread_done=None):
+        # files => [{"url", "out", "key": (table, *key) | None, "blob": path | None,
+        #            "md5": hex | None}]
+        # stored ones are dropped, on_thread_done() once the rest is on disk
+        files = [f for f in files if not self.stored(f)]
+        left = [len(files)]
+        pending = PENDING.get()
+        on_end = pending.done if pending else None
+        if pending:
+            pending.add(len(files))
+
+        def file_done(f):
+            if f.get("md5"):
+                self.verified(f["out"], f["md5"])
+            if self.pack:
+                self.pack.add_file(f["out"], self.pack.tmp(f["out"]))
+            if self.index and f.get("key"):
+                self.index.add(*f["key"], out=f["out"])
+            left[0] -= 1
+            if not left[0] and on_thread_done:
+                on_thread_done()
+
+        if not files and on_thread_done:
+            on_thread_done()
+
+        for f in files:
+            path = self.pack.tmp(f["out"]) if self.pack else f["out"]
+            if self.aria2:
+                self._aria2_put(
+                    f["url"], path, lambda f=f: file_done(f), f.get("md5"), on_end
+                )
+            else:
+                await self.dl.put(
+                    f["url"],
+                    path,
+                    lambda f=f: file_done(f),
+                    f.get("blob"),
+                    f.get("md5"),
+                    on_end,
+                )
+
+    def _aria2_put(
+        self, url, path, on_done, md5=None, on_end=None
+    ):  # no cas blobs, straight to path
+        loop = asyncio.get_running_loop()
+        path = Path(path)
+        checksum = f"md5={md5}" if md5 else None
+
+        def add(attempt):
+            def stopped(s):  # poller thread => back into the loop
+                if s["status"] == "complete":
+                    loop.call_soon_threadsafe(on_done)
+                elif s.get("errorCode") == "32" and attempt < adl.VERIFY_TRIES:
+                    log.warning(f"{url} => md5 mismatch, requeued")
+                    path.unlink(missing_ok=True)
+                    add(attempt + 1)
+                    return
+                if on_end:
+                    loop.call_soon_threadsafe(on_end)
+
+            self.aria2.add(url, path.parent, path.name, stopped, checksum)
+
+        add(1)
+
+    async def _discover(self, site):
+        try:
+            with stats.timer("discover", site=site.url):
+                async for th in site.threads(self):
+                    stats.add("threads_total", site=site.url)
+                    await self.queue.put((site, th))
+        except Exception as e:
+            log.error(f"{site.url} => {e!r}")
+
+    async def _worker(self):
+        while True:
+            site, th, *on_settled = await self.queue.get()
+            pending = Pending(*on_settled) if on_settled else None
+            PENDING.set(pending)  # this worker task only
+            try:
+                with stats.timer("thread", site=site.url):
+                    await site.dump_thread(self, th)
+            except Exception as e:
+                log.error(f"{site.url} {th} => {e!r}")
+            finally:
+                if pending:
+                    pending.done()
+                self.queue.task_done()
+
+    async def run(self, sites, discover=None):
+        # discover => coroutine fn(site) feeding self.queue instead of one pass
+        # over site.threads() (daemon.py polls forever)
+        if self.options.aria2:
+            import aria2rpc  # requests, only needed with -x
+
+            self.aria2 = aria2rpc.Aria2(
+                {
+                    "max-concurrent-downloads": self.options.workers,
+                    "max-connection-per-server": self.options.per_host,
+                    # out of process => only the budget at start, no weights
+                    "max-overall-download-limit": bw.SHAPER.rate,
+                },
+                self.options.proxy,
+            )
+        try:
+            async with self.dl:
+                workers = [
+                    asyncio.create_task(self._worker())
+                    for _ in range(self.options.threads)
+                ]
+                discover = discover or self._discover
+                await asyncio.gather(*(discover(s) for s in sites))
+                await self.queue.join()
+                for w in workers:
+                    w.cancel()
+                if self.aria2:
+                    await asyncio.to_thread(self.aria2.join)
+        finally:
+            if self.aria2:
+                self.aria2.close()
+            if self.index:
+                self.index.close()
+
+
+def site_for(arg, _from, _to):
+    name, sep, url = arg.partition(":")
+    if not (sep and name in SITES):
+        url = arg
+        host = urlparse(url).hostname or ""
+        name = next((m for h, m in HOSTS.items() if h in host), None)
+        if not name:
+            raise SystemExit(f"{arg}: unknown site, use <{'|'.join(SITES)}>:<url>")
+
+    return importlib.import_module(name).Site(url, _from, _to)
+
+
+def make_parser(usage="%prog [options] startpage-endpage <link to board> ..."):
+    parser = optparse.OptionParser(usage=usage)
+    parser.add_option(
+        "-j", dest="workers", type=int, default=8, help="parallel downloads (all hosts)"
+    )
+    parser.add_option(
+        "-c", dest="per_host", type=int, default=2, help="connections per host"
+    )
+    parser.add_option(
+        "-t", dest="threads", type=int, default=4, help="threads dumped at once"
+    )
+    parser.add_option(
+        "-r", dest="rate", type=float, default=0, help="requests/sec per host (0 = off)"
+    )
+    parser.add_option("-b", dest="burst", type=int, default=8, help="burst per host")
+    parser.add_option(
+        "-p", dest="proxy", default=None, help="proxy (http://127.0.0.1:10809)"
+    )
+    parser.add_option(
+        "-l",
+        dest="bandwidth",
+        default=None,
+        help="download budget, bytes/sec for the whole run (4M), see bw.py",
+    )
+    parser.add_option(
+        "-d",
+        dest="index",
+        default="index.db",
+        help="download index (sqlite), '' to disable",
+    )
+    parser.add_option(
+        "-i",
+        dest="incremental",
+        action="store_true",
+        help="vichan: only threads changed since last run (needs -d)",
+    )
+    parser.add_option(
+        "-s",
+        dest="store",
+        default=None,
+        help="content-addressed store dir (hardlink dedup)",
+    )
+    parser.add_option(
+        "-a",
+        dest="pack",
+        action="store_true",
+        help="pack every thread into <thread>.tar + .idx (appended on re-runs)",
+    )
+    parser.add_option(
+        "-x",
+        dest="aria2",
+        action="store_true",
+        help="media through one aria2c daemon (rpc) instead of the built-in downloader",
+    )
+    return parser
+
+
+def main(site=None, example="0-5 https://wapchan.org/cel"):
+    # site => one adapter for every board (vichan.py, ...), None => by url
+    parser = make_parser()
+    options, arguments = parser.parse_args()
+
+    if len(arguments) < 2:
+        print(sys.argv[0], "startpage-endpage <link to board>")
+        print(sys.argv[0], example)
+        sys.exit()
+
+    if options.incremental and not options.index:
+        parser.error("-i needs the download index (-d)")
+
+    _from, _to = map(int, arguments[0].split("-"))
+
+    setup_log()
+    stats.start()
+    if site:
+        sites = [site(url, _from, _to) for url in arguments[1:]]
+    else:
+        sites = [site_for(url, _from, _to) for url in arguments[1:]]
+
+    asyncio.run(Crawl(options).run(sites))
+
+
+if __name__ == "__main__":
+    main(
+        example="0-5 https://wapchan.org/cel https://hikari3.ch/t https://img.heyuri.net/b/"
+    )
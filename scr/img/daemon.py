@@ -0,0 +1,172 @@
+#!/usr/bin/env -S uv run --script
+
+# /// script
+# dependencies = [
+#   "httpx",
+#   "requests",
+#   "bs4",
+#   "loguru",
+#   "schedule",
+# ]
+# ///
+
+# continuous archiving: every board of boards.toml is polled forever through
+# one crawl.py pipeline, busy boards often and dead ones rarely. the interval
+# follows the new-post rate seen between polls (ewma, TARGET new posts per
+# poll), every poll lands somewhere in +-JITTER of it and the first ones are
+# spread over the board's min, so hundreds of boards never fire together
+#
+#   daemon.py boards.toml
+#   daemon.py -x -s store boards.toml      (crawl.py options apply)
+#
+# boards.toml, one table per board, crawl.py urls (or name:url) + futaba up.htm:
+#   ["https://wapchan.org/cel"]
+#   pages = "0-5"
+#   ["https://may.2chan.net/b/futaba.htm"]
+#   min = 30
+#   ["https://dec.2chan.net/up2/up.htm"]
+#   max = 7200
+
+import asyncio
+import random
+import sys
+import time
+import tomllib
+
+from loguru import logger as log
+
+import crawl
+import futabaup
+import stats
+
+PAGES = "0-5"
+MIN = 60  # seconds between polls of one board, per-board min / max in the toml
+MAX = 3600
+TARGET = 20  # new posts per poll the interval aims at
+ALPHA = 0.3  # ewma weight of the last poll
+JITTER = 0.2
+KEEP = 5000  # threads remembered per board (post counts)
+
+
+class Board:
+    def __init__(self, url, site, lo=MIN, hi=MAX):
+        self.url = url
+        self.site = site  # crawl.py adapter, None => futabaup.dump()
+        self.min, self.max = lo, hi
+        self.interval = lo
+        self.rate = None  # new posts/sec, ewma
+        self.last = None  # monotonic time of the last good poll
+        self.posts = {}  # thread => posts at the last poll, oldest first
+        self.inflight = set()  # threads queued / dumping / downloading
+
+    def seen(self, key, n):  # => posts new since the last poll
+        old = self.posts.pop(key, 0)
+        self.posts[key] = n
+        if len(self.posts) > KEEP:
+            del self.posts[next(iter(self.posts))]
+        return max(0, n - old)
+
+    def update(self, new, now):
+        if self.last is not None:  # first poll only sets the baseline
+            rate = new / max(now - self.last, 1e-3)
+            if self.rate is None:
+                self.rate = rate
+            else:
+                self.rate = ALPHA * rate + (1 - ALPHA) * self.rate
+            # quiet board => back off step by step, not straight to max
+            interval = TARGET / self.rate if self.rate else self.interval * 2
+            self.interval = min(self.max, max(self.min, interval))
+        self.last = now
+
+    def failed(self):
+        self.interval = min(self.max, self.interval * 2)
+
+    def delay(self):
+        return self.interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+async def poll(c, b):  # => new posts
+    if b.site is None:  # up.htm lists files, no threads, own aria2c
+        return await asyncio.to_thread(futabaup.dump, b.url)
+
+    # adapters without posts() => every unseen thread counts as one post and
+    # every thread is dumped again, with post counts only the changed ones
+    posts = getattr(b.site, "posts", lambda th: (th, None))
+    new = 0
+    async for th in b.site.threads(c):
+        stats.add("threads_total", site=b.url)
+        key, n = posts(th)
+        if key in b.inflight:  # last one not done yet, its new posts count next time
+            continue
+        grown = b.seen(key, 1 if n is None else n)
+        new += grown
+        if n is not None and not grown:
+            continue
+        b.inflight.add(key)
+        await c.queue.put((b.site, th, lambda key=key: b.inflight.discard(key)))
+    return new
+
+
+async def watch(c, b):
+    await asyncio.sleep(random.uniform(0, b.min))
+    while True:
+        t = time.monotonic()
+        try:
+            with stats.timer("poll", site=b.url):
+                new = await poll(c, b)
+            b.update(new, t)
+            stats.add("polls_total", site=b.url, result="ok")
+            stats.add("posts_new_total", new, site=b.url)
+            log.info(
+                f"{b.url}: +{new} posts, {(b.rate or 0) * 3600:.0f}/h "
+                f"=> every {b.interval:.0f}s"
+            )
+        except Exception as e:
+            b.failed()
+            stats.add("polls_total", site=b.url, result="failed")
+            log.error(f"{b.url} => {e!r}, next in {b.interval:.0f}s")
+        await asyncio.sleep(max(0, b.delay() - (time.monotonic() - t)))
+
+
+def load(path, lo=MIN, hi=MAX):
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+
+    boards = []
+    for url, cfg in config.items():
+        _from, _to = map(int, cfg.get("pages", PAGES).split("-"))
+        if url.endswith("up.htm"):  # https://dec.2chan.net/up2/up.htm
+            site = None
+        else:
+            site = crawl.site_for(url, _from, _to)
+            url = site.url
+        boards.append(Board(url, site, cfg.get("min", lo), cfg.get("max", hi)))
+    return boards
+
+
+if __name__ == "__main__":
+    parser = crawl.make_parser(usage="%prog [options] boards.toml")
+    parser.add_option("-m", dest="min", type=int, default=MIN, help="min interval, s")
+    parser.add_option("-M", dest="max", type=int, default=MAX, help="max interval, s")
+    options, arguments = parser.parse_args()
+
+    if len(arguments) != 1:
+        parser.print_usage()
+        sys.exit()
+
+    # re-dumping unchanged vichan threads every poll makes no sense
+    options.incremental = bool(options.index)
+
+    crawl.setup_log()
+    stats.start()
+    boards = load(arguments[0], options.min, options.max)
+    log.info(f"{len(boards)} boards")
+
+    c = crawl.Crawl(options)
+    try:
+        asyncio.run(c.run(boards, lambda b: watch(c, b)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if futabaup.ARIA2:
+            futabaup.ARIA2.close()
@@ -2,45 +2,171 @@
 
 # /// script
 # dependencies = [
-#   "requests",
+#   "httpx",
 #   "bs4",
+#   "loguru",
 # ]
 # ///
 
 # # based on https://gist.github.com/xatier/63bcdbe4b5ad7f93b0bf
-import requests
+import httpx
+import optparse
 import os
-import subprocess
+import re
 import sys
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse
+
+from loguru import logger as log
+
+import cache
+import links
+import net
+import stats
+
+# same tree as gallery-dl's 2chan extractor => gallery-dl/2chan/<board_name>/<thread>/<tim>.<ext>
+OUT_DIR = Path("gallery-dl", "2chan")
+CHUNK = 1 << 16
+
+
+def text(r):
+    if "charset" not in r.headers.get("Content-Type", ""):
+        r.encoding = "cp932"  # Shift_JIS pages without charset in header
+    return r.text
+
+
+def get(url):
+    if CACHE:
+        return CACHE.get(net.get, url)
+    return net.get(url)
+
+
+def download(url, path):
+    if path.exists():
+        return False
+
+    part = path.with_name(path.name + ".part")
+    with net.client().stream("GET", url) as r:
+        r.raise_for_status()
+        with open(part, "wb") as f:
+            for chunk in r.iter_bytes(CHUNK):
+                f.write(chunk)
+
+    os.replace(part, path)
+    ts = net.mtime(r.headers)
+    if ts is not None:
+        os.utime(path, (ts, ts))
+    return True
+
+
+def parse_thread(thread, page):  # => out dir, pic urls
+    # https://may.2chan.net/b/res/123456789.htm
+    u = urlparse(thread)
+    board, _, no = u.path.strip("/").partition("/res/")
+    no = no.removesuffix(".htm")
+
+    # <title>スレ本文 - 二次元裏＠ふたば</title>
+    m = re.search(r"<title>(.*?)</title>", page, re.S)
+    board_name = m.group(1).rpartition(" - ")[2][:-4] if m else board
+
+    files = []
+    for href in links.hrefs(page):
+        if href.startswith(f"/{board}/src/"):  # /b/src/1700000000000.jpg
+            url = f"{u.scheme}://{u.netloc}{href}"
+            if url not in files:
+                files.append(url)
+
+    return OUT_DIR / board_name / no, files
+
+
+def page_sfxs(html):
+    page_sfx = ["futaba.htm"]
+    for a in links.anchors(html):
+        if "accesskey" in a:
+            page_sfx.append(a.get("href"))
+    return page_sfx
+
+
+def thread_links(html, url):
+    return [f"{url}/{htm}" for htm in links.hrefs(html) if "res" in htm]
+
+
+def dump_thread(thread):
+    try:
+        page = text(get(thread))
+    except httpx.HTTPError as e:
+        print(f"{thread} => {e}", file=sys.stderr)
+        return 0, 0
+
+    out, files = parse_thread(thread, page)
+    out.mkdir(parents=True, exist_ok=True)
+    new = 0
+    for url in files:
+        try:
+            new += download(url, out / os.path.basename(url))
+        except httpx.HTTPError as e:
+            print(f"{url} => {e}", file=sys.stderr)
+
+    return new, len(files)
 
 
 def dump(url):
     if "htm" in url:  # 'http://dat.2chan.net/r/5.htm'
         url = os.path.dirname(url)  # 'http://dat.2chan.net/r'
 
-    soup = BeautifulSoup(requests.get(url).text, "html.parser")
-
-    page_sfx = ["futaba.htm"]
-    for sp in soup.find_all("a"):
-        if "accesskey=" in str(sp):
-            page_sfx.append(sp.get("href"))
+    page_sfx = page_sfxs(text(get(url)))
 
     threads = []
     for sfx in page_sfx:
-        soup = BeautifulSoup(requests.get(f"{url}/{sfx}").text, "html.parser")
-        htm_links = [
-            x.get("href") for x in soup.find_all("a") if "res" in x.get("href")
-        ]
-        for htm in htm_links:
-            threads.append(f"{url}/{htm}")
+        threads += thread_links(text(get(f"{url}/{sfx}")), url)
 
         print(f"{page_sfx.index(sfx) + 1} / {len(page_sfx)}", end="\r")
 
-    for thread in threads:
-        print(f"{threads.index(thread) + 1} / {len(threads)}", end="      \n")
-        subprocess.run(["gallery-dl", thread])
+    threads = list(dict.fromkeys(threads))
+    with ThreadPoolExecutor(options.jobs) as pool:
+        done = pool.map(dump_thread, threads)
+        for i, (thread, (new, total)) in enumerate(zip(threads, done), 1):
+            print(f"{i} / {len(threads)} {thread} +{new}/{total}", end="      \n")
+
+
+class Site:  # crawl.py adapter, pages are whatever the board links (no range)
+    def __init__(self, url, _from=0, _to=0):
+        if "htm" in url:  # 'http://dat.2chan.net/r/5.htm'
+            url = os.path.dirname(url)  # 'http://dat.2chan.net/r'
+        self.url = url
+
+    async def threads(self, c):
+        seen = set()
+        for sfx in page_sfxs(text(await c.get(self.url))):
+            for thread in thread_links(
+                text(await c.get(f"{self.url}/{sfx}")), self.url
+            ):
+                if thread not in seen:
+                    seen.add(thread)
+                    yield thread
+
+    async def dump_thread(self, c, thread):
+        out, files = parse_thread(thread, text(await c.get(thread)))
+        log.debug(f"{thread} {len(files)}")
+        await c.put_thread(
+            [{"url": u, "out": out / os.path.basename(u)} for u in files]
+        )
+
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser(usage="%prog [options] <link to board> ...")
+    parser.add_option(
+        "-j", dest="jobs", type=int, default=4, help="threads dumped at once"
+    )
+    options, arguments = parser.parse_args()
+
+    if not arguments:
+        print(sys.argv[0], "https://may.2chan.net/b/futaba.htm")
+        sys.exit()
 
+    CACHE = cache.open_default()
+    stats.start()
 
-for i in range(1, len(sys.argv)):
-    dump(sys.argv[i])
+    for url in arguments:
+        dump(url)
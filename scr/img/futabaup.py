@@ -2,6 +2,7 @@
 
 # /// script
 # dependencies = [
+#   "httpx",
 #   "requests",
 #   "bs4",
 #   "loguru",
@@ -9,112 +10,179 @@
 # ]
 # ///
 
-import requests
-import subprocess
+import httpx
 import sys
-import random
-import string
+import os
+import json
+import time
 import pathlib
+import threading
+import optparse
+import schedule
 from bs4 import BeautifulSoup
 
 from loguru import logger as log
 
+import aria2rpc
+import cache
+import net
+import stats
+
 trace, info, err, succ = (log.trace, log.info, log.error, log.success)
 
-log.remove(0)
-log.add(
-    sys.stderr,
-    format="<level>[{time:DD-MMM-YYYY HH:mm:ss}]</level> {message}",
-    backtrace=True,
-    diagnose=True,
-    colorize=True,
-    level=5,
-)
+# in out dir => {"complete": {url: bool}, "files": {del id: file}}
+MANIFEST = "manifest.json"
+CACHE = cache.open_default()  # conditional get on up.htm
 
-files = []
-ARIA2_FILENAME = (
-    "".join(random.choice(string.ascii_letters) for x in range(10)) + ".txt"
-)
+ARIA2 = None  # aria2rpc.Aria2, one daemon for every poll
+MANIFESTS = {}  # path => manifest, shared with the aria2 callbacks
+INFLIGHT = set()  # del ids queued in aria2, not re-added by the next poll
+LOCK = threading.Lock()
 
 
-def fileDel(filename):
-    rem_file = pathlib.Path(filename)
-    rem_file.unlink(missing_ok=True)
+def load_manifest(path):
+    if path in MANIFESTS:
+        return MANIFESTS[path]
 
+    manifest = {"complete": {}, "files": {}}
+    if path.is_file():
+        manifest.update(json.loads(path.read_text(encoding="utf-8")))
+    MANIFESTS[path] = manifest
+    return manifest
 
-def add(dir, bin):
-    with open(dir, "a", encoding="utf-8") as file:
-        file.write(bin + "\n")
 
+def save_manifest(path, manifest):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
 
-def dump(url):
-    log.debug(url)
-    r = requests.get(url)
-    if not r:
-        err("no ret")
-        return
 
-    main_soup = BeautifulSoup(r.text, "html.parser")
-    tr_soup = main_soup.find_all("tr")
+def parse(html):
+    files = {}
 
-    for tr in tr_soup:
-        tr = str(tr)
-        if "bgcolor" in tr or "SIZE(KB)" in tr:  # header
+    for tr in BeautifulSoup(html, "html.parser").find_all("tr"):
+        if tr.has_attr("bgcolor") or "SIZE(KB)" in tr.text:  # header
             continue
-        if '<span class="deleted">' in tr:  # deleted
-            err("deleted")
+        if tr.find("span", class_="deleted"):  # deleted
             continue
 
-        soup = BeautifulSoup(str(tr), "html.parser")
-        f_del = soup.find("a", href=lambda x: x and "up.php?del=" in x).get("href")
-        f_name = soup.find("td", class_="fnm").a.text
-        f_link = soup.find("td", class_="fnm").a.get("href")
-        f_code = soup.find("td", class_="fco").text
-        f_size = soup.find("td", class_="fsz").text
-        f_date = soup.find("td", class_="fnw").text
-
-        file = [f_del, f_name, f_link, f_code, f_size, f_date]
-        files.append(file)
-        succ(file)
-
-    fileDel(ARIA2_FILENAME)
-
-    for f in files:
-        add(ARIA2_FILENAME, f"https://dec.2chan.net/up2/{f[2]}\n    out={f[1]}")
-
-    aria2c_args = [
-        "aria2c",
-        f"--input-file={ARIA2_FILENAME}",
-        "--dir=up2",
-        "--max-connection-per-server=2",
-        "--max-concurrent-downloads=5",
-        "--auto-file-renaming=false",
-        "--remote-time=true",
-        "--log-level=error",
-        "--console-log-level=error",
-        "--download-result=hide",
-        "--summary-interval=0",
-        "--file-allocation=none",
-        "--continue=true",
-        #'--all-proxy=http://127.0.0.1:10809'
-    ]
-    subprocess.run(aria2c_args)
-    print("", end="\r", flush=True)
-    fileDel(ARIA2_FILENAME)
-
-
-if len(sys.argv) < 2:
-    print(sys.argv[0], "<link>")
-    print(sys.argv[0], "https://dec.2chan.net/up2/up.htm")
-    sys.exit()
-
-for i in range(1, len(sys.argv)):
-    dump(sys.argv[i])
-
-"""
-schedule.every().minute.at(":00").do(dump, url='https://dec.2chan.net/up2/up.htm')
-
-while True:
-    schedule.run_pending()
-    time.sleep(1)
-"""
+        f_del = tr.find("a", href=lambda x: x and "up.php?del=" in x)
+        fnm = tr.find("td", class_="fnm")
+        if not f_del or not fnm or not fnm.a:
+            continue
+
+        # up.php?del=1234567 => 1234567
+        del_id = f_del.get("href").split("del=")[-1]
+        files[del_id] = {
+            "name": fnm.a.text,
+            "link": fnm.a.get("href"),
+            "code": tr.find("td", class_="fco").text,
+            "size": tr.find("td", class_="fsz").text,
+            "date": tr.find("td", class_="fnw").text,
+        }
+
+    return files
+
+
+def dump(url):  # => new files queued (daemon.py polls by it)
+    base = url.rsplit("/", 1)[0]  # https://dec.2chan.net/up2
+    out = pathlib.Path(base.rsplit("/", 1)[-1])  # up2
+    out.mkdir(exist_ok=True)
+
+    manifest_path = out / MANIFEST
+    manifest = load_manifest(manifest_path)
+
+    global ARIA2
+    log.debug(url)
+    try:
+        if CACHE:
+            r = CACHE.get(net.get, url)
+        else:
+            r = net.get(url)
+    except httpx.HTTPError as e:
+        err(f"{url} => {e}")
+        return 0
+
+    # 304 and everything listed is stored => nothing to parse
+    if getattr(r, "not_modified", False) and manifest["complete"].get(url):
+        trace("not modified")
+        return 0
+    if r.is_error:
+        err(f"no ret ({r.status_code})")
+        return 0
+
+    files = parse(r.text)
+
+    # only what actually landed on disk goes to the manifest,
+    # failed ones are retried next poll
+    def file_done(status, del_id, f):
+        with LOCK:
+            INFLIGHT.discard(del_id)
+            if status["status"] == "complete":
+                manifest["files"][del_id] = f
+            manifest["complete"][url] = all(k in manifest["files"] for k in files)
+            save_manifest(manifest_path, manifest)
+
+    with LOCK:
+        new = {
+            k: v
+            for k, v in files.items()
+            if k not in manifest["files"] and k not in INFLIGHT
+        }
+        INFLIGHT.update(new)
+        manifest["complete"][url] = all(k in manifest["files"] for k in files)
+        save_manifest(manifest_path, manifest)
+
+    if new and not ARIA2:
+        ARIA2 = aria2rpc.Aria2()
+
+    for del_id, f in new.items():
+        succ([f["name"], f["link"], f["size"], f["date"]])
+        ARIA2.add(
+            f"{base}/{f['link']}",
+            out,
+            f["name"],
+            lambda s, k=del_id, f=f: file_done(s, k, f),
+        )
+
+    info(f"{len(files)} files, {len(new)} new")
+    return len(new)
+
+
+if __name__ == "__main__":
+    log.remove(0)
+    log.add(
+        sys.stderr,
+        format="<level>[{time:DD-MMM-YYYY HH:mm:ss}]</level> {message}",
+        backtrace=True,
+        diagnose=True,
+        colorize=True,
+        level=5,
+    )
+
+    parser = optparse.OptionParser(usage="%prog [options] <link> ...")
+    parser.add_option(
+        "-w", dest="watch", type=int, default=0, help="poll every N seconds (0 = once)"
+    )
+    options, arguments = parser.parse_args()
+
+    if not arguments:
+        print(sys.argv[0], "<link>")
+        print(sys.argv[0], "https://dec.2chan.net/up2/up.htm")
+        sys.exit()
+
+    stats.start()
+    for url in arguments:
+        dump(url)
+
+    if options.watch:
+        for url in arguments:
+            schedule.every(options.watch).seconds.do(dump, url=url)
+
+        while True:
+            schedule.run_pending()
+            time.sleep(1)
+
+    if ARIA2:
+        ARIA2.join()
+        ARIA2.close()
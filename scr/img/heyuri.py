@@ -2,149 +2,173 @@
 
 # /// script
 # dependencies = [
-#   "requests",
+#   "httpx",
 #   "bs4",
 #   "loguru",
 # ]
 # ///
 
-import requests
 import os
-import time
-import subprocess
 import sys
 import re
-from bs4 import BeautifulSoup
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger as log
 
-DELAY = 1
-
-log.remove(0)
-log.add(
-    sys.stderr,
-    format="<level>[{time:DD-MMM-YYYY HH:mm:ss}]</level> {message}",
-    backtrace=True,
-    diagnose=True,
-    colorize=True,
-    level=5,
-)
-log.add(
-    "log.txt",
-    format="[{time:DD-MMM-YYYY HH:mm:ss}] {message}",
-    backtrace=True,
-    diagnose=True,
-    colorize=True,
-    level=5,
-)
-
-
-def add(dir, bin):
-    with open(dir, "a", encoding="utf-8") as file:
-        file.write(bin + "\n")
-
-
-def dump_thread(url):
-    img_urls = []
-
-    soup = BeautifulSoup(requests.get(url).text, "html.parser")
-    htm_urls = [x.get("href") for x in soup.find_all("a") if x.get("href") is not None]
-
-    # //img.heyuri.net/b/src/1732386430483.jpg
-    for htm in htm_urls:
-        if not htm.startswith("//img.heyuri.net/"):
-            continue
-        if "/src/" not in htm:
-            continue
+import cache
+import crawl
+import links
+import rl
+import stats
 
-        img_urls.append(f"https:{htm}")
+# per host, 429/503 slow it down on their own
+RATE = 2  # requests/sec
+BURST = 4
+WORKERS = 4  # pics at once
+THREADS = 4  # threads at once, each into its own dir
 
-    img_urls = list(set(img_urls))  # remove duplicates
-    log.debug(f"{len(img_urls)} pics to dump")
 
-    _dir = os.listdir()
+def get(url):  # pages => http cache, pics go straight through the limiter
+    if CACHE:
+        return CACHE.get(limiter.get, url)
+    return limiter.get(url)
 
-    img_urls.insert(0, "-nc")
-    img_urls.insert(0, "wget")
-    subprocess.run(img_urls)  # , stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    print()
 
-    return
-
-
-def dump(url, _from, _to):
+def board_of(url):
     if "html" in url:
-        url = os.path.dirname(url)
-
-    board_sfx = url[url.rfind(".net") + 5 : -1]  # /b/
-    _range = [x for x in range(_from, _to + 1)]
-    log.trace(f"{url} => {board_sfx}")
+        url = os.path.dirname(url) + "/"
+    return url, urlparse(url).path.strip("/").rsplit("/", 1)[-1]  # /b/ => b
 
-    soup = BeautifulSoup(requests.get(url).text, "html.parser")
 
+def page_sfxs(html, _range):
     page_sfx = []
     if 0 in _range:
         page_sfx.append("index.html")
 
-    for sp in soup.find_all("a"):
-        if ".html?" not in str(sp):
+    for href in links.hrefs(html):
+        if ".html?" not in href:
             continue
-        href = sp.get("href")
         if len(href) > 9:  # > 999.html
             continue
         for i in _range:
             if href.startswith(f"{i}.html?"):
                 page_sfx.append(href)
+    return page_sfx
+
+
+def thread_links(html, threads):  # new koko.php?res= links => threads
+    for htm in links.hrefs(html):
+        if not htm.startswith("koko.php?res="):
+            continue
+        if "#p" in htm:
+            continue
+        if "#q" in htm:
+            continue
+        if htm in threads:
+            continue
+
+        threads.append(htm)
+
+
+def thread_id(thread):
+    match = re.search(r"res=(\d+)", thread)
+    return match.group(1) if match else None
+
+
+def pic_urls(html, url):
+    img_urls = []
+    u = urlparse(url)
 
+    # //img.heyuri.net/b/src/1732386430483.jpg
+    for htm in links.hrefs(html):
+        if not htm.startswith(f"//{u.netloc}/"):
+            continue
+        if "/src/" not in htm:
+            continue
+
+        img_urls.append(f"{u.scheme}:{htm}")
+
+    return list(set(img_urls))  # remove duplicates
+
+
+def dump_thread(url, out):
+    img_urls = pic_urls(get(url).text, url)
+    log.debug(f"{url}: {len(img_urls)} pics to dump")
+
+    os.makedirs(out, exist_ok=True)
+    new = limiter.download_all(img_urls, out, workers=WORKERS)
+    log.debug(f"{url}: +{new}")
+
+
+def dump(url, _from, _to):
+    url, board_sfx = board_of(url)
+    _range = [x for x in range(_from, _to + 1)]
+    log.trace(f"{url} => {board_sfx}")
+
+    page_sfx = page_sfxs(get(url).text, _range)
     log.trace(f"total pages => {len(page_sfx)}")
 
     threads = []
     for sfx in page_sfx:
-        th = url + sfx
-
-        soup = BeautifulSoup(requests.get(th).text, "html.parser")
-        htm_links = [
-            x.get("href") for x in soup.find_all("a") if x.get("href") is not None
-        ]
-        for htm in htm_links:
-            if not htm.startswith("koko.php?res="):
-                continue
-            if "#p" in htm:
-                continue
-            if "#q" in htm:
-                continue
-            if htm in threads:
-                continue
-
-            threads.append(htm)
-
+        thread_links(get(url + sfx).text, threads)
         print(f"{page_sfx.index(sfx) + 1} / {len(page_sfx)}", end="\r")
-        time.sleep(DELAY)
 
     for thread in threads:
-        match = re.search(r"res=(\d+)", thread)
-        if not match:
+        if not thread_id(thread):
             log.error(url)
             log.error("no match in re url!")
             sys.exit()
-        thread_id = match.group(1)
 
-        name = f"{board_sfx} {thread_id}"
-        os.makedirs(name, exist_ok=True)
-        os.chdir(name)
+    def one(i, thread):
+        log.trace(f"[{i} / {len(threads)}] {thread}")
+        try:
+            dump_thread(url + thread, f"{board_sfx} {thread_id(thread)}")
+        except Exception as e:
+            log.error(f"{url}{thread} => {e!r}")
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(one, range(1, len(threads) + 1), threads))
 
-        log.trace(f"[{threads.index(thread) + 1} / {len(threads)}] {thread}")
-        dump_thread(url + thread)
-        time.sleep(DELAY)
 
-        os.chdir("..")
+class Site:  # crawl.py adapter
+    def __init__(self, url, _from, _to):
+        self.url, self.board_sfx = board_of(url)
+        self.range = range(_from, _to + 1)
+
+    async def threads(self, c):
+        log.trace(f"{self.url} => {self.board_sfx}")
+        page_sfx = page_sfxs((await c.get(self.url)).text, self.range)
+
+        threads = []
+        for sfx in page_sfx:
+            new = len(threads)
+            thread_links((await c.get(self.url + sfx)).text, threads)
+            for thread in threads[new:]:
+                yield thread
+
+    async def dump_thread(self, c, thread):
+        name = f"{self.board_sfx} {thread_id(thread)}"
+        log.trace(f"{self.url}{thread}")
+
+        img_urls = pic_urls((await c.get(self.url + thread)).text, self.url)
+        files = [
+            {"url": u, "out": os.path.join(name, os.path.basename(u))} for u in img_urls
+        ]
+        await c.put_thread(files)
+
 
+if __name__ == "__main__":
+    crawl.setup_log()
+    stats.start()
+    limiter = rl.Limiter(RATE, BURST)
+    CACHE = cache.open_default()
 
-if len(sys.argv) < 3:
-    print(sys.argv[0], "startpage-endpage <link to board>")
-    print(sys.argv[0], "0-5 https://img.heyuri.net/b/")
-    sys.exit()
+    if len(sys.argv) < 3:
+        print(sys.argv[0], "startpage-endpage <link to board>")
+        print(sys.argv[0], "0-5 https://img.heyuri.net/b/")
+        sys.exit()
 
-_from, _to = sys.argv[1].split("-")
+    _from, _to = sys.argv[1].split("-")
 
-for i in range(2, len(sys.argv)):
-    dump(sys.argv[i], int(_from), int(_to))
+    for i in range(2, len(sys.argv)):
+        dump(sys.argv[i], int(_from), int(_to))
@@ -2,97 +2,146 @@
 
 # /// script
 # dependencies = [
-#   "requests",
+#   "httpx",
 #   "bs4",
 #   "loguru",
 # ]
 # ///
 
-import requests
 import os
-import time
-import subprocess
 import sys
-from bs4 import BeautifulSoup
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 
+from loguru import logger as log
 
-def dump_thread(link, board_sfx):
-    img_links = []
+import cache
+import links
+import rl
+import stats
+
+# per host, 429/503 slow it down on their own
+RATE = 2  # requests/sec
+BURST = 4
+WORKERS = 4  # pics at once
+THREADS = 4  # threads at once, each into its own dir
+
+
+def get(url):  # pages => http cache, pics go straight through the limiter
+    if CACHE:
+        return CACHE.get(limiter.get, url)
+    return limiter.get(url)
+
+
+def board_of(_url):
+    if "html" in _url:  # 'http://ii.yakuji.moe/azu/5.html'
+        _url = os.path.dirname(_url)  # 'http://ii.yakuji.moe/azu'
+    return _url, _url[_url.rfind("/") + 1 :]  # azu
 
-    soup = BeautifulSoup(requests.get(link).text, "html.parser")
-    htm_links = [x.get("href") for x in soup.find_all("a") if x.get("href") is not None]
 
-    for htm in htm_links:
+def page_sfxs(html):
+    page_sfx = ["index.html"]
+    for href in links.hrefs(html):
+        if ".html" in href and len(href) < 10:  # 9999
+            page_sfx.append(href)
+    return page_sfx
+
+
+def thread_links(html, _url):
+    threads = []
+    for htm in links.hrefs(html):
+        if htm.startswith("./res/") and htm.endswith(".html"):  #'./res/10992.html'
+            threads.append(_url + htm[1:])
+    return threads
+
+
+def pic_links(html, board_sfx, url):
+    img_links = []
+    u = urlparse(url)
+
+    for htm in links.hrefs(html):
         if htm.startswith(f"/{board_sfx}/src/") and htm.endswith(
             (".jpg", ".png", ".gif", ".swf")
         ):  # /azu/src/1316779210367.jpg
-            img_links.append("http://ii.yakuji.moe" + htm)
+            img_links.append(f"{u.scheme}://{u.netloc}{htm}")  # http://ii.yakuji.moe
 
-    img_links = list(set(img_links))  # remove duplicates
-    _dir = os.listdir()
+    return list(set(img_links))  # remove duplicates
 
-    img_links.insert(0, "-nc")
-    img_links.insert(0, "wget")
-    subprocess.run(img_links)
 
+def dump_thread(link, board_sfx, out):
+    os.makedirs(out, exist_ok=True)
+    limiter.download_all(
+        pic_links(get(link).text, board_sfx, link), out, workers=WORKERS
+    )
 
-def dump(_url, _from, _to):
-    if "html" in _url:  # 'http://ii.yakuji.moe/azu/5.html'
-        _url = os.path.dirname(_url)  # 'http://ii.yakuji.moe/azu'
 
-    board_sfx = _url[_url.rfind("/") + 1 :]  # azu
+def dump(_url, _from, _to):
+    _url, board_sfx = board_of(_url)
     _range = [x for x in range(_from, _to)]
 
-    os.makedirs(board_sfx, exist_ok=True)
-    os.chdir(board_sfx)
-
-    soup = BeautifulSoup(requests.get(_url).text, "html.parser")
-
-    page_sfx = ["index.html"]
-    for sp in soup.find_all("a"):
-        if ".html" in str(sp) and len(sp.get("href")) < 10:  # 9999
-            page_sfx.append(sp.get("href"))
+    page_sfx = page_sfxs(get(_url).text)
 
     threads = []
     for sfx in page_sfx:
         if page_sfx.index(sfx) not in _range:
             continue
 
-        soup = BeautifulSoup(requests.get(f"{_url}/{sfx}").text, "html.parser")
-        htm_links = [
-            x.get("href") for x in soup.find_all("a") if x.get("href") is not None
-        ]
-
-        for htm in htm_links:
-            if htm.startswith("./res/") and htm.endswith(".html"):  #'./res/10992.html'
-                threads.append(_url + htm[1:])
+        threads += thread_links(get(f"{_url}/{sfx}").text, _url)
 
         print(threads)
         print(f"{page_sfx.index(sfx) + 1} / {len(page_sfx)}", end="\r")
-        time.sleep(1)
 
-    for thread in threads:
+    def one(i, thread):
         num = thread[thread.rfind("/") + 1 : -5]
-        os.makedirs(num, exist_ok=True)
-        os.chdir(num)
+        print(f"({i} / {len(threads)}) {thread}", end="      \n")
+        try:
+            dump_thread(thread, board_sfx, os.path.join(board_sfx, num))
+        except Exception as e:
+            print(f"{thread} => {e!r}", file=sys.stderr)
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(one, range(1, len(threads) + 1), threads))
+
+
+class Site:  # crawl.py adapter
+    def __init__(self, url, _from, _to):
+        self.url, self.board_sfx = board_of(url)
+        self.range = range(_from, _to)  # end page not included, as in dump()
 
-        print(
-            f"({threads.index(thread) + 1} / {len(threads)}) {thread}", end="      \n"
-        )
-        dump_thread(thread, board_sfx)
-        time.sleep(1)
+    async def threads(self, c):
+        page_sfx = page_sfxs((await c.get(self.url)).text)
 
-        os.chdir("..")
+        for i, sfx in enumerate(page_sfx):
+            if i not in self.range:
+                continue
+            for thread in thread_links(
+                (await c.get(f"{self.url}/{sfx}")).text, self.url
+            ):
+                yield thread
+
+    async def dump_thread(self, c, thread):
+        num = thread[thread.rfind("/") + 1 : -5]
+        out = os.path.join(self.board_sfx, num)
+        log.debug(thread)
+
+        img_links = pic_links((await c.get(thread)).text, self.board_sfx, thread)
+        files = [
+            {"url": u, "out": os.path.join(out, os.path.basename(u))} for u in img_links
+        ]
+        await c.put_thread(files)
 
-    os.chdir("..")
 
+if __name__ == "__main__":
+    stats.start()
+    limiter = rl.Limiter(RATE, BURST)
+    CACHE = cache.open_default()
 
-if len(sys.argv) < 3:
-    print(sys.argv[0], "startpage-endpage <link to board>")
-    print(sys.argv[0], "0-5 http://ii.yakuji.moe/azu")
-    sys.exit()
+    if len(sys.argv) < 3:
+        print(sys.argv[0], "startpage-endpage <link to board>")
+        print(sys.argv[0], "0-5 http://ii.yakuji.moe/azu")
+        sys.exit()
 
-_from, _to = sys.argv[1].split("-")
+    _from, _to = sys.argv[1].split("-")
 
-for i in range(2, len(sys.argv)):
-    dump(sys.argv[i], int(_from), int(_to))
+    for i in range(2, len(sys.argv)):
+        dump(sys.argv[i], int(_from), int(_to))
@@ -0,0 +1,69 @@
+# sqlite index of already stored files, checked before anything is queued
+# vichan => (board, no, tim, md5), lynxchan => (board, path)
+# + per-thread catalog state (last_modified, replies, images) for incremental runs
+
+import sqlite3
+
+COMMIT_EVERY = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vichan (
+    board TEXT, no INTEGER, tim TEXT, md5 TEXT, out TEXT,
+    PRIMARY KEY (board, no, tim, md5)
+);
+CREATE TABLE IF NOT EXISTS lynxchan (
+    board TEXT, path TEXT, out TEXT,
+    PRIMARY KEY (board, path)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    board TEXT, no INTEGER, last_modified INTEGER, replies INTEGER, images INTEGER,
+    PRIMARY KEY (board, no)
+);
+"""
+
+KEYS = {
+    "vichan": ("board", "no", "tim", "md5"),
+    "lynxchan": ("board", "path"),
+}
+
+
+class Index:
+    def __init__(self, path="index.db"):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.pending = 0
+
+    def has(self, table, *key):
+        where = " AND ".join(f"{k} = ?" for k in KEYS[table])
+        q = f"SELECT 1 FROM {table} WHERE {where}"
+        return self.db.execute(q, key).fetchone() is not None
+
+    def add(self, table, *key, out=None):
+        cols = ", ".join(KEYS[table] + ("out",))
+        marks = ", ".join("?" * (len(key) + 1))
+        q = f"INSERT OR REPLACE INTO {table} ({cols}) VALUES ({marks})"
+        self.db.execute(q, (*key, str(out)))
+
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.commit()
+
+    def thread_changed(self, board, no, state):
+        # state => (last_modified, replies, images) from catalog.json
+        q = "SELECT last_modified, replies, images FROM threads WHERE board = ? AND no = ?"
+        return self.db.execute(q, (board, no)).fetchone() != tuple(state)
+
+    def thread_done(self, board, no, state):
+        q = "INSERT OR REPLACE INTO threads VALUES (?, ?, ?, ?, ?)"
+        self.db.execute(q, (board, no, *state))
+        self.commit()
+
+    def commit(self):
+        self.db.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.db.close()
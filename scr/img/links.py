@@ -0,0 +1,124 @@
+# <a> extraction for the html scrappers, no dom needed just to get hrefs
+# bs4 (reference), lxml (parser target, no tree), stream (regex tokenizer)
+# first page picks the fastest backend that matches bs4, see bench_links.py
+
+import html
+import re
+import time
+
+from loguru import logger as log
+
+import stats
+
+# html.parser skips these, so the tokenizer has to too: comments, cdata, any
+# other <!...> / <?...?> (doctype, <?php ... ?>, unclosed comment / cdata all
+# end at the first ">" there too), </ + non-letter, script / style bodies
+SKIP = re.compile(
+    r"<!--.*?-->"
+    r"|<!\[CDATA\[.*?\]\]>"
+    r"|<[!?][^>]*(?:>|\Z)"
+    r"|</(?![a-z])[^>]*(?:>|\Z)"
+    r"|<(script|style)\b[^>]*>.*?(?:</\1\s*>|\Z)",
+    re.S | re.I,
+)
+TAG_A = re.compile(r"<a(?=[\s/>])((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>", re.I)
+ATTR = re.compile(
+    r"((?<=['\"\s/])[^\s/>][^\s/=>]*)(\s*=+\s*('[^']*'|\"[^\"]*\"|(?!['\"])[^>\s]*))?"
+)
+
+
+def anchors_stream(text):
+    out = []
+    pos = 0
+    for m in SKIP.finditer(text):
+        out += _scan(text, pos, m.start())
+        pos = m.end()
+    out += _scan(text, pos, len(text))
+    return out
+
+
+def _scan(text, start, end):
+    out = []
+    for m in TAG_A.finditer(text, start, end):
+        attrs = {}
+        for name, eq, value in ATTR.findall(" " + m.group(1)):
+            if not eq:
+                value = ""
+            elif value[:1] in ("'", '"'):
+                value = value[1:-1]
+            attrs[name.lower()] = html.unescape(value)
+        out.append(attrs)
+    return out
+
+
+def anchors_lxml(text):
+    from lxml import etree
+
+    class Target:
+        def __init__(self):
+            self.out = []
+
+        def start(self, tag, attrib):
+            if tag == "a":
+                self.out.append({k: v or "" for k, v in attrib.items()})
+
+        def end(self, tag):
+            pass
+
+        def data(self, data):
+            pass
+
+        def close(self):
+            return self.out
+
+    parser = etree.HTMLParser(target=Target())
+    parser.feed(text)
+    return parser.close()
+
+
+def anchors_bs4(text):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(text, "html.parser", multi_valued_attributes=None)
+    return [{k: v or "" for k, v in a.attrs.items()} for a in soup.find_all("a")]
+
+
+BACKENDS = {  # fastest first
+    "stream": anchors_stream,
+    "lxml": anchors_lxml,
+    "bs4": anchors_bs4,
+}
+BACKEND = None  # None => picked on first page
+
+
+def pick(text):
+    ref = anchors_bs4(text)
+    best, best_t = "bs4", None
+
+    for name, fn in BACKENDS.items():
+        try:
+            t = time.perf_counter()
+            ret = fn(text)
+            t = time.perf_counter() - t
+        except ImportError:
+            continue
+        if ret != ref:
+            log.trace(f"links: {name} differs from bs4, skipped")
+            continue
+        if best_t is None or t < best_t:
+            best, best_t = name, t
+
+    log.trace(f"links: {best}")
+    return best
+
+
+def anchors(text):  # attrs of every <a>, in page order
+    global BACKEND
+    if BACKEND is None:
+        BACKEND = pick(text)
+    with stats.timer("parse", backend=BACKEND):
+        return BACKENDS[BACKEND](text)
+
+
+def hrefs(text):
+    return [a["href"] for a in anchors(text) if "href" in a]
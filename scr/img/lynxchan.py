@@ -2,54 +2,16 @@
 
 # /// script
 # dependencies = [
-#   "requests",
-#   "bs4",
+#   "httpx",
 #   "loguru",
 # ]
 # ///
 
-import requests
 import os
-import subprocess
-import sys
-import re
-import pathlib
+from urllib.parse import urlparse
 from loguru import logger as log
 
-MAIN_URL = None  #  https://hikari3.ch/t/
-
-log.remove(0)
-log.add(
-    sys.stderr,
-    format="<level>[{time:DD-MMM-YYYY HH:mm:ss}]</level> {message}",
-    backtrace=True,
-    diagnose=True,
-    colorize=True,
-    level=5,
-)
-log.add(
-    "log.txt",
-    format="[{time:DD-MMM-YYYY HH:mm:ss}] {message}",
-    backtrace=True,
-    diagnose=True,
-    colorize=True,
-    level=5,
-)
-
-
-def fileDel(filename):
-    rem_file = pathlib.Path(filename)
-    rem_file.unlink(missing_ok=True)
-
-
-def add(dir, bin):
-    with open(dir, "a", encoding="utf-8") as file:
-        file.write(bin + "\n")
-
-
-def str_cut(string, letters, postfix="..."):
-    return string[:letters] + (string[letters:] and postfix)
-
+import crawl
 
 """
 def str_cut_re(string, letters, postfix='...'): # reverse
@@ -60,104 +22,103 @@ def str_cut_re(string, letters, postfix='...'): # reverse
 """
 
 
-def str_fix(string):
-    return str_cut(re.sub(r'[/\\?%*:{}【】|"<>]', "", string), 200, "")
-
-
-def dump_thread(th_url):
-    global MAIN_URL
-    images = []
-
-    log.debug(th_url)
-    r = requests.get(th_url).json()
-
-    dirname = str(r["threadId"])
-    if "subject" in r and r["subject"]:
-        dirname += " " + str_fix(r["subject"])
-
-    # op pics
-    if r["files"]:
-        for file in r["files"]:
-            filename = str_cut(file["originalName"], 200, "")
-            f = f"{r['threadId']} {filename}"  #  94  teplé ponožky.jpeg
-            u = f"https://hikari3.ch{file['path']}"  # https://hikari3.ch/.media/ae3....b4d.jpg
-            images.append([f, u])
-
-    for post in r["posts"]:
-        files = post["files"]
-        if not files:
-            continue
-
-        for file in files:
-            filename = str_cut(file["originalName"], 200, "")
-            f = f"{post['postId']} {filename}"
-            u = f"https://hikari3.ch{file['path']}"
-            images.append([f, u])
-
-    if not images:
-        log.error(f"{th_url} (no images)")
-        return
-
-    fileDel("tmp.txt")
-    for img in images:
-        add("tmp.txt", f"{img[1]}\n    out={img[0]}")
-
-    aria2c_args = [
-        "aria2c",
-        "--input-file=tmp.txt",
-        f"--dir={dirname}",
-        "--max-connection-per-server=1",
-        "--max-concurrent-downloads=2",
-        "--auto-file-renaming=false",
-        "--remote-time=true",
-        "--log-level=error",
-        "--console-log-level=error",
-        "--download-result=hide",
-        "--summary-interval=0",
-        "--file-allocation=none",
-    ]
-
-    subprocess.run(aria2c_args)
-    print("", end="\r", flush=True)
-    return
-
-
-def dump(url, _from, _to):
-    global MAIN_URL
-    if "htm" in url:  # https://hikari3.ch/t/index.html
-        url = os.path.dirname(url)  # https://hikari3.ch/t/
-    MAIN_URL = url
-    log.info(MAIN_URL)
-
-    _range = [x for x in range(_from, _to + 1)]
-
-    for i in range(1, 337):
-        if i not in _range:
-            continue
-
-        # https://hikari3.ch/t/5.json
-        u = MAIN_URL + f"/{i}.json"
-        r = requests.get(u)
-
-        if not r:
-            log.success("no more pages")
-            break
-
-        threads = r.json()["threads"]
-        log.trace("page %s" % i)
-
-        for th in threads:
-            # https://hikari3.ch/t/res/48.json
-            th_url = f"{MAIN_URL}/res/{th['threadId']}.json"
-            dump_thread(th_url)
-
-
-if len(sys.argv) < 3:
-    print(sys.argv[0], "startpage-endpage <link to board>")
-    print(sys.argv[0], "0-5 https://hikari3.ch/t")
-    sys.exit()
-
-_from, _to = sys.argv[1].split("-")
-
-for i in range(2, len(sys.argv)):
-    dump(sys.argv[i], int(_from), int(_to))
+class Site:  # crawl.py adapter
+    def __init__(self, url, _from, _to):
+        if "htm" in url:  # https://hikari3.ch/t/index.html
+            url = os.path.dirname(url)  # https://hikari3.ch/t/
+        self.url = url
+        u = urlparse(url)
+        self.host = f"{u.scheme}://{u.netloc}"  # media paths are host-absolute
+        self.range = range(_from, _to + 1)
+
+    async def probe_pages(self, c):  # no catalog.json => page by page
+        for i in range(1, 337):
+            if i not in self.range:
+                continue
+
+            # https://hikari3.ch/t/5.json
+            u = self.url + f"/{i}.json"
+            r = await c.get(u)
+
+            if r is None or r.is_error:
+                log.success("no more pages")
+                break
+
+            log.trace("page %s" % i)
+            for th in r.json()["threads"]:
+                yield th["threadId"], None  # no post count on pages
+
+    async def threads(self, c):
+        log.info(self.url)
+
+        # whole board in one request => https://hikari3.ch/t/catalog.json
+        r = await c.get(self.url + "/catalog.json")
+        if r is not None and r.is_success:
+            threads = [
+                (th["threadId"], th.get("postCount"))
+                for th in r.json()
+                if th.get("page", self.range.start) in self.range
+            ]
+            log.trace(f"{len(threads)} threads")
+            for th in threads:
+                yield th
+        else:
+            log.warning("no catalog.json, probing pages")
+            async for th in self.probe_pages(c):
+                yield th
+
+    def posts(self, th):  # daemon.py => (thread, posts in it) from the catalog
+        no, replies = th
+        return no, None if replies is None else replies + 1
+
+    async def dump_thread(self, c, th):
+        no, _ = th
+        th_url = f"{self.url}/res/{no}.json"  # https://hikari3.ch/t/res/48.json
+        images = []
+
+        log.debug(th_url)
+        resp = await c.get(th_url)
+        r = resp.json()
+
+        dirname = str(r["threadId"])
+        if "subject" in r and r["subject"]:
+            dirname += " " + crawl.str_fix(r["subject"])
+
+        # thread json next to the media, like vichan.py (posts.py indexes it)
+        c.save(os.path.join(dirname, f"{dirname}.json"), resp)
+
+        # op pics
+        if r["files"]:
+            for file in r["files"]:
+                filename = crawl.str_cut(file["originalName"], 200, "")
+                f = f"{r['threadId']} {filename}"  #  94  teplé ponožky.jpeg
+                images.append([f, file["path"]])  # /.media/ae3....b4d.jpg
+
+        for post in r["posts"]:
+            files = post["files"]
+            if not files:
+                continue
+
+            for file in files:
+                filename = crawl.str_cut(file["originalName"], 200, "")
+                f = f"{post['postId']} {filename}"
+                images.append([f, file["path"]])
+
+        if not images:
+            log.error(f"{th_url} (no images)")
+            return
+
+        files = [
+            {
+                "url": self.host + path,  # https://hikari3.ch/.media/ae3....b4d.jpg
+                "out": os.path.join(dirname, f),
+                "key": ("lynxchan", self.url, path),
+                "blob": c.store.lynxchan(path) if c.store else None,
+            }
+            for f, path in images
+        ]
+        await c.put_thread(files)
+
+
+if __name__ == "__main__":
+    crawl.main(Site, "0-5 https://hikari3.ch/t")
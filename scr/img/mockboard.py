@@ -0,0 +1,434 @@
+#!/usr/bin/env -S uv run --script
+
+# /// script
+# dependencies = []  # stdlib only
+# ///
+
+# local imageboard for benchmarks / regression runs, nothing hits real sites
+# serves a fixture dir (generated with -g or recorded by hand) with the
+# layouts the scrappers expect, optionally slow / throttled / flaky:
+#
+#   /vichan/b/catalog.json  /vichan/b/res/<no>.json  /vichan/b/src/<tim>.<ext>
+#   /lynxchan/t/catalog.json  /lynxchan/t/res/<no>.json  /.media/<sha256>.<ext>
+#   /futaba/b/futaba.htm  /futaba/b/<n>.htm  /futaba/b/res/<no>.htm  (cp932)
+#   /heyuri/b/  /heyuri/b/koko.php?res=<no>   (query => "@" in the file name)
+#   /azu/  /azu/res/<no>.html  /azu/src/<tim>.jpg   (ii.yakuji.moe)
+#   /2008-03/index.html  /2008-03/<id>.jpg   (nendoroid fc2, pics without ext)
+#
+#   mockboard.py -g -d fixtures                       generate + serve
+#   mockboard.py -d fixtures -l 80 -b 2048 -e 0.02    80 ms, 2 MB/s, 2% 503s
+#   mockboard.py -d fixtures -C 0.1                   10% of media corrupted
+#   GET /_stats => {site: {"requests", "bytes"}}, GET /_reset zeroes it
+
+import base64
+import email.utils
+import hashlib
+import json
+import optparse
+import os
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+CHUNK = 16 * 1024
+TYPES = {
+    ".json": "application/json",
+    ".html": "text/html",
+    ".htm": "text/html",  # no charset, like 2chan => cp932 guess in futaba.py
+    ".jpg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webm": "video/webm",
+}
+MEDIA = (".jpg", ".png", ".gif", ".webm")  # only these get corrupted
+MTIME = 1700000000  # fixed Last-Modified => stable conditional gets
+
+
+class Config:
+    latency = 0.0  # seconds per response
+    jitter = 0.0  # + uniform(0, jitter)
+    bandwidth = 0  # bytes/sec per connection, 0 = unlimited
+    errors = 0.0  # share of 503 (Retry-After: 1) responses
+    resets = 0.0  # share of bodies cut off halfway
+    corrupt = 0.0  # share of media bodies with one byte flipped
+
+
+class Stats:
+    lock = threading.Lock()
+    sites = {}
+
+    @classmethod
+    def add(cls, site, requests=0, nbytes=0):
+        with cls.lock:
+            s = cls.sites.setdefault(site, {"requests": 0, "bytes": 0})
+            s["requests"] += requests
+            s["bytes"] += nbytes
+
+
+def site_of(path):  # first path part, fc2 month dirs and yakuji boards by name
+    head = path.strip("/").split("/", 1)[0]
+    if head[:2] == "20":
+        return "nendroid"
+    if head == ".media":
+        return "lynxchan"
+    if head in ("vichan", "lynxchan", "futaba", "heyuri"):
+        return head
+    return "iiyakuji" if head else "-"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real boards
+    root = Path(".")
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.serve(body=False)
+
+    def do_GET(self):
+        self.serve(body=True)
+
+    def reply(self, code, body=b"", headers=None):
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def file(self):
+        path, sep, query = self.path.partition("?")  # "1.html?" => "1.html@"
+        name = unquote(path).lstrip("/")
+        if sep:
+            name += "@" + unquote(query)
+        path = (self.root / name).resolve()
+        if self.root.resolve() not in path.parents and path != self.root.resolve():
+            return None
+        if path.is_dir():  # 2chan serves futaba.htm for the board dir
+            index = path / "index.html"
+            path = index if index.exists() else path / "futaba.htm"
+        return path if path.is_file() else None
+
+    def serve(self, body):
+        if self.path == "/_stats":
+            return self.reply(200, json.dumps(Stats.sites).encode())
+        if self.path == "/_reset":
+            with Stats.lock:
+                Stats.sites.clear()
+            return self.reply(200)
+
+        site = site_of(urlsplit(self.path).path)
+        Stats.add(site, requests=1)
+
+        if Config.latency or Config.jitter:
+            time.sleep(Config.latency + random.uniform(0, Config.jitter))
+        if random.random() < Config.errors:
+            return self.reply(503, headers={"Retry-After": "1"})
+
+        path = self.file()
+        if not path:
+            return self.reply(404)
+
+        data = path.read_bytes()
+        etag = '"%s"' % hashlib.md5(data).hexdigest()[:16]
+        headers = {
+            "Content-Type": TYPES.get(path.suffix, "application/octet-stream"),
+            "Last-Modified": email.utils.formatdate(MTIME, usegmt=True),
+            "ETag": etag,
+            "Accept-Ranges": "bytes",
+        }
+        if self.headers.get("If-None-Match") == etag:
+            return self.reply(304, headers=headers)
+        try:
+            since = email.utils.parsedate_to_datetime(self.headers["If-Modified-Since"])
+            if since.timestamp() >= MTIME:
+                return self.reply(304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+        code = 200
+        rng = self.headers.get("Range", "")
+        if rng.startswith("bytes="):
+            a, _, b = rng[6:].partition("-")
+            a = int(a) if a else 0
+            b = min(int(b), len(data) - 1) if b else len(data) - 1
+            if a >= len(data):
+                return self.reply(
+                    416, headers={"Content-Range": f"bytes */{len(data)}"}
+                )
+            headers["Content-Range"] = f"bytes {a}-{b}/{len(data)}"
+            data, code = data[a : b + 1], 206
+
+        self.send_response(code)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if not body:
+            return
+
+        if random.random() < Config.corrupt and path.suffix in MEDIA and data:
+            data = bytearray(data)
+            data[len(data) // 2] ^= 0xFF
+
+        cut = len(data) // 2 if random.random() < Config.resets else None
+        sent = 0
+        try:
+            for i in range(0, len(data), CHUNK):
+                chunk = data[i : i + CHUNK]
+                if cut is not None and sent + len(chunk) > cut:
+                    self.wfile.write(chunk[: cut - sent])
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if Config.bandwidth:
+                    time.sleep(len(chunk) / Config.bandwidth)
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+        finally:
+            Stats.add(site, nbytes=sent)
+
+
+# fixtures
+
+
+def blob(rng, size):
+    return rng.randbytes(size)
+
+
+def write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data if isinstance(data, bytes) else data.encode())
+
+
+def sizes(rng, img_kb, big_mb, n):  # mostly small pics, every big_mb => a few webms
+    out = []
+    for i in range(n):
+        if big_mb and i % 25 == 24:
+            out.append((".webm", big_mb * 1024 * 1024))
+        else:
+            out.append(
+                (
+                    rng.choice([".jpg", ".png"]),
+                    rng.randint(img_kb // 2, img_kb * 3 // 2) * 1024,
+                )
+            )
+    return out
+
+
+def gen_vichan(root, rng, threads, posts, img_kb, big_mb):
+    board = root / "vichan" / "b"
+    catalog, per_page = [], 10
+    tim = 1700000000000
+    for t in range(threads):
+        no = 1000 + t * 100
+        items = []
+        for p, (ext, size) in enumerate(sizes(rng, img_kb, big_mb, posts)):
+            tim += 1
+            data = blob(rng, size)
+            write(board / "src" / f"{tim}{ext}", data)
+            items.append(
+                {
+                    "no": no + p,
+                    "time": MTIME,
+                    "tim": tim,
+                    "filename": f"pic{p}",
+                    "ext": ext,
+                    "fsize": size,
+                    "md5": base64.b64encode(hashlib.md5(data).digest()).decode(),
+                    **({"sub": f"thread {t}"} if p == 0 else {}),
+                }
+            )
+        write(board / "res" / f"{no}.json", json.dumps({"posts": items}))
+        th = {"no": no, "last_modified": MTIME, "replies": posts - 1, "images": posts}
+        if t % per_page == 0:
+            catalog.append({"page": t // per_page, "threads": []})
+        catalog[-1]["threads"].append(th)
+    write(board / "catalog.json", json.dumps(catalog))
+
+
+def gen_lynxchan(root, rng, threads, posts, img_kb, big_mb):
+    board = root / "lynxchan" / "t"
+    catalog = []
+    for t in range(threads):
+        no = 2000 + t * 100
+        files = []
+        for ext, size in sizes(rng, img_kb, big_mb, posts):
+            data = blob(rng, size)
+            path = f"/.media/{hashlib.sha256(data).hexdigest()}{ext}"
+            write(root / path.lstrip("/"), data)
+            files.append({"originalName": f"pic{len(files)}{ext}", "path": path})
+        thread = {
+            "threadId": no,
+            "subject": f"thread {t}",
+            "files": files[:1],
+            "posts": [
+                {"postId": no + i, "files": [f]} for i, f in enumerate(files[1:], 1)
+            ],
+        }
+        write(board / "res" / f"{no}.json", json.dumps(thread))
+        catalog.append(
+            {"threadId": no, "page": t // 10, "postCount": len(thread["posts"])}
+        )
+    write(board / "catalog.json", json.dumps(catalog))
+
+
+def gen_futaba(root, rng, threads, posts, img_kb, big_mb):
+    board = root / "futaba" / "b"
+    pages = max(1, (threads + 9) // 10)
+    tim = 1710000000000
+    for n in range(pages):
+        links = []
+        for t in range(n * 10, min(threads, n * 10 + 10)):
+            no = 3000 + t
+            hrefs = []
+            for ext, size in sizes(rng, img_kb, big_mb, posts):
+                tim += 1
+                write(board / "src" / f"{tim}{ext}", blob(rng, size))
+                hrefs.append(f'<a href="/futaba/b/src/{tim}{ext}">{tim}{ext}</a>')
+            page = f"<html><title>スレ{no} - 二次元裏＠ふたば</title><body>{''.join(hrefs)}</body></html>"
+            write(board / "res" / f"{no}.htm", page.encode("cp932"))
+            links.append(f'<a href="res/{no}.htm">返信</a>')
+        nav = "".join(
+            f'<a href="{i}.htm" accesskey="{i}">[{i}]</a>' for i in range(1, pages)
+        )
+        page = f"<html><body>{''.join(links)}{nav}</body></html>"
+        write(board / ("futaba.htm" if n == 0 else f"{n}.htm"), page.encode("cp932"))
+
+
+def gen_heyuri(root, rng, threads, posts, img_kb, big_mb, host):
+    board = root / "heyuri" / "b"
+    pages = max(1, (threads + 9) // 10)
+    tim = 1720000000000
+    nav = "".join(f'<a href="{i}.html?">{i}</a>' for i in range(1, pages))
+    for n in range(pages):
+        links = []
+        for t in range(n * 10, min(threads, n * 10 + 10)):
+            no = 4000 + t
+            hrefs = []
+            for ext, size in sizes(rng, img_kb, big_mb, posts):
+                tim += 1
+                write(board / "src" / f"{tim}{ext}", blob(rng, size))
+                hrefs.append(f'<a href="//{host}/heyuri/b/src/{tim}{ext}">f</a>')
+            write(board / f"koko.php@res={no}", "<html>" + "".join(hrefs) + "</html>")
+            links.append(f'<a href="koko.php?res={no}">Reply</a>')
+        name = "index.html" if n == 0 else f"{n}.html@"
+        write(board / name, "<html>" + "".join(links) + nav + "</html>")
+
+
+def gen_iiyakuji(root, rng, threads, posts, img_kb, big_mb):
+    board = root / "azu"
+    pages = max(1, (threads + 9) // 10)
+    tim = 1730000000000
+    nav = "".join(f'<a href="{i}.html">{i}</a>' for i in range(1, pages))
+    for n in range(pages):
+        links = []
+        for t in range(n * 10, min(threads, n * 10 + 10)):
+            no = 5000 + t
+            hrefs = []
+            for _, size in sizes(rng, img_kb, 0, posts):
+                tim += 1
+                write(board / "src" / f"{tim}.jpg", blob(rng, size))
+                hrefs.append(f'<a href="/azu/src/{tim}.jpg">f</a>')
+            write(board / "res" / f"{no}.html", "<html>" + "".join(hrefs) + "</html>")
+            links.append(f'<a href="./res/{no}.html">Reply</a>')
+        name = "index.html" if n == 0 else f"{n}.html"
+        write(board / name, "<html>" + "".join(links) + nav + "</html>")
+
+
+def gen_nendroid(root, rng, threads, posts, img_kb):
+    month = root / "2008-03"
+    pics = threads * posts
+    pages = max(1, (pics + 19) // 20)
+    for n in range(pages):
+        tds = []
+        for i in range(n * 20, min(pics, n * 20 + 20)):
+            pid = 1200000000000 + i
+            ext = ("jpg", "jpg", "jpg", "gif", "png")[i % 5]  # mostly jpg, like fc2
+            write(month / f"{pid}.{ext}", blob(rng, img_kb * 1024))
+            tds.append(
+                f'<td><a href="{pid}.html"><img src="thumbs/{pid}.jpg" alt="{pid}"></a></td>'
+            )
+        # last link of the "Page" row => page count
+        nav = "".join(f'<a href="index{i}.html">{i}</a>' for i in range(1, pages + 1))
+        nav = f"<tr><td>Page {nav}</td></tr>"
+        name = "index.html" if n == 0 else f"index{n + 1}.html"
+        write(month / name, f"<html><table>{nav}<tr>{''.join(tds)}</tr></table></html>")
+
+
+def generate(root, host, threads=20, posts=10, img_kb=64, big_mb=0, seed=1):
+    rng = random.Random(seed)
+    root = Path(root)
+    gen_vichan(root, rng, threads, posts, img_kb, big_mb)
+    gen_lynxchan(root, rng, threads, posts, img_kb, big_mb)
+    gen_futaba(root, rng, threads, posts, img_kb, big_mb)
+    gen_heyuri(root, rng, threads, posts, img_kb, big_mb, host)
+    gen_iiyakuji(root, rng, threads, posts, img_kb, big_mb)
+    gen_nendroid(root, rng, threads, posts, img_kb)
+
+
+def serve(root, port=0, host="127.0.0.1"):  # => server, running in a thread
+    handler = type("Handler", (Handler,), {"root": Path(root)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def configure(
+    latency_ms=0, jitter_ms=0, bandwidth_kb=0, errors=0.0, resets=0.0, corrupt=0.0
+):
+    Config.latency = latency_ms / 1000
+    Config.jitter = jitter_ms / 1000
+    Config.bandwidth = bandwidth_kb * 1024
+    Config.errors = errors
+    Config.resets = resets
+    Config.corrupt = corrupt
+
+
+def options(parser):  # shared with bench_e2e.py
+    parser.add_option("-d", dest="dir", default="fixtures", help="fixture dir")
+    parser.add_option("-p", dest="port", type=int, default=8800, help="port")
+    parser.add_option("-l", dest="latency", type=float, default=0, help="latency, ms")
+    parser.add_option("-J", dest="jitter", type=float, default=0, help="+ random ms")
+    parser.add_option(
+        "-b", dest="bandwidth", type=float, default=0, help="KB/s per connection"
+    )
+    parser.add_option("-e", dest="errors", type=float, default=0, help="503 share")
+    parser.add_option("-R", dest="resets", type=float, default=0, help="cut bodies")
+    parser.add_option("-C", dest="corrupt", type=float, default=0, help="flip a byte")
+    parser.add_option("-g", dest="gen", action="store_true", help="generate fixtures")
+    parser.add_option("-t", dest="threads", type=int, default=20, help="threads/board")
+    parser.add_option("-n", dest="posts", type=int, default=10, help="pics/thread")
+    parser.add_option("-k", dest="img_kb", type=int, default=64, help="pic size, KB")
+    parser.add_option(
+        "-B", dest="big_mb", type=int, default=0, help="every 25th pic is N MB webm"
+    )
+
+
+def setup(o):  # options => generated fixtures + configured handler
+    configure(o.latency, o.jitter, o.bandwidth, o.errors, o.resets, o.corrupt)
+    if o.gen:
+        generate(o.dir, f"127.0.0.1:{o.port}", o.threads, o.posts, o.img_kb, o.big_mb)
+
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser(usage="%prog [options]")
+    options(parser)
+    o, _ = parser.parse_args()
+
+    setup(o)
+    server = serve(o.dir, o.port)
+    print(f"http://127.0.0.1:{server.server_port}/ <= {os.path.abspath(o.dir)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
@@ -2,35 +2,52 @@
 
 # /// script
 # dependencies = [
-#   "requests",
+#   "httpx[socks]",
 #   "bs4",
 #   "loguru",
-#   "pysocks"
 # ]
 # ///
 
 from bs4 import BeautifulSoup
 from loguru import logger as log
-import requests
+import httpx
 
 from urllib.parse import urlparse
 from pathlib import Path
-from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+import threading
+import email.utils
+import json
 import time
 import sys
 import re
 import os
 
-# need "proxies"
-proxy = {}
+import cache
+import net
+import stats
+
+# need proxies => "socks5://127.0.0.1:10808"
+proxy = None
 
 # and real-lookin headers
 header = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:128.0) Gecko/20100101 Firefox/128.0"
 }
+net.configure(proxy=proxy, headers=header)
 
 not_exists = ("1223753394222")  # fmt: skip
 
+EXTS = ["jpg", "gif", "png"]
+EXT_CACHE = Path("ext.json")  # {"http://.../2008-03/123": "http://.../2008-03/123.jpg"}
+PROBE_WORKERS = 8
+
+# streamed writes, memory per download stays at one chunk
+CHUNK_SIZE = 64 * 1024
+
+CACHE = cache.open_default()  # html pages only
+
 nend_urls = [
     "http://nendoroid01.web.fc2.com/2008-03/",
     "http://nendoroid01.web.fc2.com/2008-04/",
@@ -54,22 +71,119 @@ nend_urls = [
 ]
 
 
-def get_with_retries(url, max_retries=5, retry_delay=10):
+def download(url, file_path, chunk_size=CHUNK_SIZE, max_retries=5, revalidate=False):
+    # streamed into <file>.part, resumed with Range after a broken transfer,
+    # renamed into place only when complete => memory stays at one chunk
+    # revalidate => file there already, its mtime (Last-Modified) as
+    # If-Modified-Since, 304 keeps it
+    part = file_path.with_name(file_path.name + ".part")
+    ts = None
+
+    for attempt in range(max_retries):
+        done = part.stat().st_size if part.is_file() else 0
+        h = {"Range": f"bytes={done}-"} if done else {}
+        if revalidate and not done and file_path.is_file():
+            mtime = file_path.stat().st_mtime
+            h["If-Modified-Since"] = email.utils.formatdate(mtime, usegmt=True)
+
+        try:
+            with net.client().stream("GET", url, headers=h) as r:
+                if r.status_code == 304:
+                    return
+                if r.status_code == 416:  # .part is already the whole file
+                    break
+                r.raise_for_status()
+
+                ts = net.mtime(r.headers)
+                mode = "ab" if r.status_code == 206 else "wb"
+                with open(part, mode) as f:
+                    for chunk in r.iter_bytes(chunk_size):
+                        f.write(chunk)
+            break
+        except httpx.HTTPStatusError as e:
+            raise Exception("http failed:", e, "| status:", e.response.status_code)
+        except httpx.TransportError as e:
+            log.error(str(e))
+            time.sleep(net.backoff(attempt))
+    else:
+        raise Exception(f"failed {url} after {max_retries} tries")
+
+    os.replace(part, file_path)
+
+    if ts is not None:
+        os.utime(file_path, (ts, ts))
+
+
+def head_with_retries(url, max_retries=5):
     for attempt in range(max_retries):
         try:
-            r = requests.get(url, proxies=proxy, headers=header, timeout=15)
-            r.raise_for_status()
-            return r
-        except requests.exceptions.HTTPError as e:
-            raise Exception("http failed:", e, "| status:", r.status_code)
-        except requests.exceptions.RequestException as e:
+            r = net.client().head(url)
+            if r.status_code == 405:  # no HEAD here => GET, body not read
+                with net.client().stream("GET", url) as r:
+                    return r.is_success
+            return r.is_success
+        except httpx.TransportError as e:
             log.error(str(e))
-            time.sleep(retry_delay)
+            time.sleep(net.backoff(attempt))
     raise Exception(f"failed {url} after {max_retries} tries")
 
 
+class ExtResolver:
+    # img without ext => full url, dominant ext of the month dir probed first,
+    # the rest at once, results cached in EXT_CACHE so re-runs probe nothing
+    def __init__(self, cache_path=EXT_CACHE):
+        self.cache_path = cache_path
+        self.cache = {}
+        if cache_path.is_file():
+            self.cache = json.loads(cache_path.read_text(encoding="utf-8"))
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(len(EXTS))
+
+    def order(self, month):
+        counts = self.counts.setdefault(month, Counter())
+        return sorted(EXTS, key=lambda e: -counts[e])
+
+    def resolve(self, img, dir_name):
+        if img in self.cache:
+            return self.cache[img]
+
+        exts = self.order(dir_name.name)
+        for ext in exts:  # already on disk
+            if (dir_name / f"{os.path.basename(img)}.{ext}").is_file():
+                return self.found(img, dir_name, ext)
+
+        if head_with_retries(f"{img}.{exts[0]}"):
+            return self.found(img, dir_name, exts[0])
+
+        urls = [f"{img}.{ext}" for ext in exts[1:]]
+        for ext, ok in zip(exts[1:], self.pool.map(head_with_retries, urls)):
+            if ok:
+                return self.found(img, dir_name, ext)
+
+        return None
+
+    def found(self, img, dir_name, ext):
+        with self.lock:
+            self.counts[dir_name.name][ext] += 1
+            self.cache[img] = f"{img}.{ext}"
+        return self.cache[img]
+
+    def save(self):
+        with self.lock:
+            tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+            tmp.write_text(json.dumps(self.cache, indent=1), encoding="utf-8")
+            os.replace(tmp, self.cache_path)
+
+
+def get_page(url):  # html => http cache, retries in net.get
+    r = CACHE.get(net.get, url) if CACHE else net.get(url)
+    r.raise_for_status()
+    return r
+
+
 def find_max_page(url):
-    text = requests.get(url, proxies=proxy, headers=header).text
+    text = get_page(url).text
     soup = BeautifulSoup(text, "html.parser")
 
     for i in soup.find_all("tr"):
@@ -82,8 +196,10 @@ def find_max_page(url):
 
 if __name__ == "__main__":
     log.add("log.txt", encoding="utf-8")
+    stats.start()
+    resolver = ExtResolver()
 
-    for url in nend_urls:
+    for url in sys.argv[1:] or nend_urls:  # month urls, default the whole site
         images = []
 
         # http://nendoroid01.web.fc2.com/2008-03/ => 2008-03
@@ -104,11 +220,10 @@ if __name__ == "__main__":
             file_name = os.path.basename(parsed_url.path)
             file_path = dir_name / file_name
 
-            r = get_with_retries(page)
-            with open(file_path, "wb") as f:
-                f.write(r.content)
+            # streamed + renamed like the pics, unchanged pages answer 304
+            download(page, file_path, revalidate=True)
 
-            soup = BeautifulSoup(r.text, "html.parser")
+            soup = BeautifulSoup(file_path.read_bytes(), "html.parser")
             blocks = soup.find_all("td")
 
             for block in blocks:
@@ -124,35 +239,30 @@ if __name__ == "__main__":
                         if u not in images:
                             images.append(u)
 
-        for img in images:
-            for ext in ["jpg", "gif", "png", "rip"]:
-                if ext == "rip":
-                    log.critical("EXT NOT FOUND")
-                    log.error(img)
-                    sys.exit(1)
-
-                try:
-                    img_url = f"{img}.{ext}"
-                    parsed_url = urlparse(img_url)
-                    file_name = os.path.basename(parsed_url.path)
-                    file_path = dir_name / file_name
-
-                    if file_path.is_file() or img.endswith(not_exists):
-                        log.info(img_url)
-                        break
-
-                    r = get_with_retries(img_url)
-                    with open(file_path, "wb") as f:
-                        f.write(r.content)
-
-                    if "Last-Modified" in r.headers:
-                        lm = r.headers["Last-Modified"]
-                        dt = parsedate_to_datetime(lm)
-                        ts = dt.timestamp()
-                        os.utime(file_path, (ts, ts))
-
-                    log.success(img_url)
-                    break
-
-                except Exception:
-                    log.error(img_url)
+        images = [img for img in images if not img.endswith(not_exists)]
+        with ThreadPoolExecutor(PROBE_WORKERS) as pool:
+            resolved = list(
+                pool.map(lambda img: resolver.resolve(img, dir_name), images)
+            )
+        resolver.save()
+
+        for img, img_url in zip(images, resolved):
+            if not img_url:
+                log.critical("EXT NOT FOUND")
+                log.error(img)
+                sys.exit(1)
+
+            try:
+                parsed_url = urlparse(img_url)
+                file_name = os.path.basename(parsed_url.path)
+                file_path = dir_name / file_name
+
+                if file_path.is_file():
+                    log.info(img_url)
+                    continue
+
+                download(img_url, file_path)
+                log.success(img_url)
+
+            except Exception:
+                log.error(img_url)
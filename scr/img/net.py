@@ -0,0 +1,204 @@
+# one http layer for every scrapper: pooled keep-alive clients (sync + async),
+# optional http/2, exponential backoff with full jitter, proxy / headers in one place
+#
+#   HTTP2=1        http/2 where the server speaks it (needs h2: httpx[http2])
+#   HTTP_BW=4M     download budget for the whole process, see bw.py
+#   HTTP_UA=...    user agent for every request
+#   HTTP_PROXY / HTTPS_PROXY / ALL_PROXY are picked up by httpx itself,
+#   configure(proxy=...) wins over them (-p in the scrappers)
+
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+from loguru import logger as log
+
+import bw
+import stats
+
+TRIES = 5
+BACKOFF = 1.0  # first retry waits up to this, doubled every try
+BACKOFF_MAX = 60.0
+RETRY = (429, 500, 502, 503, 504)
+TIMEOUT = httpx.Timeout(30, connect=15)
+UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:128.0) Gecko/20100101 Firefox/128.0"
+
+CONFIG = {
+    "proxy": None,
+    "http2": os.environ.get("HTTP2", "") not in ("", "0"),
+    "headers": {"User-Agent": os.environ.get("HTTP_UA", UA)},
+}
+
+_client = None
+_lock = threading.Lock()
+
+
+def configure(proxy=None, http2=None, headers=None):
+    # before the first client()/async_client(), later calls only hit new clients
+    if proxy:
+        CONFIG["proxy"] = proxy
+    if http2 is not None:
+        CONFIG["http2"] = http2
+    if headers:
+        CONFIG["headers"].update(headers)
+
+
+def _http2():
+    if not CONFIG["http2"]:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        log.warning("http/2 needs h2 (pip install httpx[http2]), using http/1.1")
+        CONFIG["http2"] = False
+    return CONFIG["http2"]
+
+
+class _Counted(httpx.SyncByteStream):  # body bytes => stats + bw, whoever reads it
+    def __init__(self, stream, host):
+        self.stream, self.host = stream, host
+
+    def __iter__(self):
+        for chunk in self.stream:
+            stats.add("http_bytes_total", len(chunk), host=self.host)
+            delay = bw.SHAPER.take(self.host, len(chunk))
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+    def close(self):
+        self.stream.close()
+
+
+class _ACounted(httpx.AsyncByteStream):
+    def __init__(self, stream, host):
+        self.stream, self.host = stream, host
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            stats.add("http_bytes_total", len(chunk), host=self.host)
+            delay = bw.SHAPER.take(self.host, len(chunk))
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+
+    async def aclose(self):
+        await self.stream.aclose()
+
+
+def _on_request(request):
+    request.t0 = time.monotonic()
+
+
+def _on_response(response):
+    host = response.request.url.host
+    stats.add("http_requests_total", host=host, status=response.status_code)
+    stats.observe(
+        "http_ttfb_seconds", time.monotonic() - response.request.t0, host=host
+    )
+    counted = (
+        _ACounted if isinstance(response.stream, httpx.AsyncByteStream) else _Counted
+    )
+    response.stream = counted(response.stream, host)
+
+
+async def _aon_request(request):
+    _on_request(request)
+
+
+async def _aon_response(response):
+    _on_response(response)
+
+
+def _options(**kwargs):
+    return {
+        "proxy": CONFIG["proxy"],
+        "http2": _http2(),
+        "headers": CONFIG["headers"],
+        "timeout": TIMEOUT,
+        "follow_redirects": True,
+        **kwargs,
+    }
+
+
+def client():  # shared sync client, safe to use from worker threads
+    global _client
+    with _lock:
+        if _client is None:
+            hooks = {"request": [_on_request], "response": [_on_response]}
+            _client = httpx.Client(**_options(event_hooks=hooks))
+        return _client
+
+
+def async_client(**kwargs):  # one per event loop, caller closes it
+    kwargs = {k: v for k, v in kwargs.items() if v is not None}
+    hooks = {"request": [_aon_request], "response": [_aon_response]}
+    return httpx.AsyncClient(**_options(event_hooks=hooks, **kwargs))
+
+
+def retry_after(r, default):
+    value = r.headers.get("Retry-After") if r is not None else None
+    if not value:
+        return default
+    if value.isdigit():
+        return int(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+def mtime(headers):  # Last-Modified => timestamp | None
+    lm = headers.get("Last-Modified")
+    if not lm:
+        return None
+    try:
+        return parsedate_to_datetime(lm).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt, r=None):
+    # full jitter => retries of many workers don't land at the same moment,
+    # Retry-After of a 429/503 is a floor
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF * 2**attempt))
+    return max(delay, retry_after(r, 0))
+
+
+def get(url, **kwargs):
+    # => last response (caller checks status), TransportError after TRIES
+    r = None
+    for attempt in range(TRIES):
+        try:
+            r = client().get(url, **kwargs)
+            if r.status_code not in RETRY:
+                return r
+            log.warning(f"{url} => {r.status_code}")
+        except httpx.TransportError as e:
+            if attempt == TRIES - 1:
+                raise
+            log.warning(f"{url} => {e!r}")
+            r = None
+        time.sleep(backoff(attempt, r))
+    return r
+
+
+async def aget(c, url, **kwargs):  # get() for an async_client()
+    r = None
+    for attempt in range(TRIES):
+        try:
+            r = await c.get(url, **kwargs)
+            if r.status_code not in RETRY:
+                return r
+            log.warning(f"{url} => {r.status_code}")
+        except httpx.TransportError as e:
+            if attempt == TRIES - 1:
+                raise
+            log.warning(f"{url} => {e!r}")
+            r = None
+        await asyncio.sleep(backoff(attempt, r))
+    return r
@@ -0,0 +1,130 @@
+# per-thread archives instead of loose files: <thread dir>.tar + <thread dir>.tar.idx
+# plain tar, appended in place (new members overwrite the end-of-archive
+# blocks), so re-runs only add what is new and any tar tool can read it.
+# .idx is one json line per member {"name", "offset", "size", "mtime"},
+# offset => start of the data, read() seeks straight to it
+#
+#   pack.py <thread>.tar            list
+#   pack.py <thread>.tar <name>     member => stdout
+
+import hashlib
+import io
+import json
+import shutil
+import sys
+import tarfile
+import time
+from pathlib import Path
+
+BLOCK = tarfile.BLOCKSIZE
+NUL = tarfile.NUL
+
+
+class Archive:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.idx = self.path.with_name(self.path.name + ".idx")
+        self.members = {}  # name => idx entry, last one wins
+        self.end = 0  # where the next header goes
+
+        if self.idx.is_file():
+            for line in self.idx.read_text(encoding="utf-8").splitlines():
+                self._seen(json.loads(line))
+        elif self.path.is_file():  # idx lost => rebuild from the tar itself
+            with tarfile.open(self.path) as tar:
+                for m in tar:
+                    e = {
+                        "name": m.name,
+                        "offset": m.offset_data,
+                        "size": m.size,
+                        "mtime": m.mtime,
+                    }
+                    self._seen(e)
+                    self._write_idx(e)
+
+    def _seen(self, e):
+        self.members[e["name"]] = e
+        self.end = max(self.end, e["offset"] + e["size"] + (-e["size"] % BLOCK))
+
+    def _write_idx(self, e):
+        with open(self.idx, "a", encoding="utf-8") as f:
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+
+    def add(self, name, src, size, mtime=None):
+        # src => file object, size bytes are copied
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime if mtime is not None else time.time())
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "r+b" if self.path.exists() else "wb") as f:
+            f.seek(self.end)
+            f.write(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape"))
+            offset = f.tell()
+            shutil.copyfileobj(src, f)
+            f.write(NUL * (-size % BLOCK))
+            f.write(NUL * 2 * BLOCK)  # end of archive, overwritten by the next add
+            f.truncate()
+
+        # idx after the data => a crash in between is just an unindexed tail
+        e = {"name": name, "offset": offset, "size": size, "mtime": info.mtime}
+        self._write_idx(e)
+        self._seen(e)
+
+    def read(self, name):
+        e = self.members[name]
+        with open(self.path, "rb") as f:
+            f.seek(e["offset"])
+            return f.read(e["size"])
+
+
+class Packer:
+    # "<thread dir>/<name>" paths => member <name> of <thread dir>.tar
+    def __init__(self, root="."):
+        self.root = Path(root)
+        self.staging = self.root / ".pack"  # downloads land here before packing
+        self.archives = {}
+
+    def _split(self, out):
+        out = Path(out)
+        return self.root / out.parent.with_name(out.parent.name + ".tar"), out.name
+
+    def archive(self, path):
+        if path not in self.archives:
+            self.archives[path] = Archive(path)
+        return self.archives[path]
+
+    def has(self, out):
+        path, name = self._split(out)
+        return name in self.archive(path).members
+
+    def tmp(self, out):  # where adl should put the file before add_file()
+        self.staging.mkdir(parents=True, exist_ok=True)
+        return self.staging / hashlib.sha1(str(out).encode()).hexdigest()
+
+    def add_file(self, out, src):
+        path, name = self._split(out)
+        src = Path(src)
+        with open(src, "rb") as f:
+            self.archive(path).add(name, f, src.stat().st_size, src.stat().st_mtime)
+        src.unlink()
+
+    def add_bytes(self, out, data, mtime=None):
+        path, name = self._split(out)
+        a = self.archive(path)
+        if name in a.members and a.read(name) == data:  # json of a quiet thread
+            return
+        a.add(name, io.BytesIO(data), len(data), mtime)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(sys.argv[0], "<thread>.tar [name]")
+        sys.exit()
+
+    a = Archive(sys.argv[1])
+    if len(sys.argv) > 2:
+        sys.stdout.buffer.write(a.read(sys.argv[2]))
+    else:
+        for e in a.members.values():
+            print(f"{e['size']:>12} {e['name']}")
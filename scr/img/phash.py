@@ -0,0 +1,310 @@
+#!/usr/bin/env -S uv run --script
+
+# /// script
+# dependencies = [
+#   "numpy",
+#   "pillow",
+#   "loguru",
+# ]
+# ///
+
+# near-duplicate pics across dumps (reposts re-encoded / resized, which the
+# md5 / sha256 dedup of cas.py never sees): 64-bit dct perceptual hashes,
+# decoded in a thread pool and hashed in numpy batches, kept in one .npz
+# (paths, hashes, size / mtime / inode, matched pairs). re-runs only hash
+# new or changed files and compare just those against the whole index
+#
+#   phash.py gallery-dl/ "b 1234/" ...          report clusters
+#   phash.py -d 4 -l dumps/                     hardlink them to the best copy
+#   phash.py -T                                 self-test (png / jpg cluster)
+#
+# a .jpg stays a jpeg => every format of a cluster keeps its own best copy.
+# report: bits to that copy, "=" already linked to it, ">" further than -d
+# (in the cluster only through other pics), -l leaves those alone
+
+import optparse
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from loguru import logger as log
+from PIL import Image
+
+INDEX = "phash.npz"
+EXTS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp")
+SIZE = 32  # pics are scaled to SIZE x SIZE grey, the low 8 x 8 dct is the hash
+DISTANCE = 6  # bits of 64, <= this => near duplicate
+BATCH = 256
+CELLS = 1 << 24  # xor matrix cells per step (128 MB), new rows x whole index
+
+Image.MAX_IMAGE_PIXELS = None  # some boards keep huge scans
+
+
+def dct_matrix(n):  # orthonormal dct-ii, X => D @ X @ D.T
+    k = np.arange(n)[:, None]
+    d = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+    d[0] /= np.sqrt(2)
+    return (d * np.sqrt(2 / n)).astype(np.float32)
+
+
+DCT = dct_matrix(SIZE)
+WEIGHTS = (1 << np.arange(63, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+if hasattr(np, "bitwise_count"):  # numpy >= 2
+    popcount = np.bitwise_count
+else:
+    _BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(a):
+        return _BITS[a.view(np.uint8)].reshape(*a.shape, 8).sum(-1)
+
+
+def pixels(path):  # => SIZE x SIZE float32 | None
+    try:
+        with Image.open(path) as im:
+            im.draft("L", (SIZE * 2, SIZE * 2))  # jpeg: decode at 1/2..1/8 scale
+            im = im.convert("L").resize((SIZE, SIZE), Image.Resampling.LANCZOS)
+            return np.asarray(im, dtype=np.float32)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        log.warning(f"{path} => {e!r}")
+        return None
+
+
+def hashes(batch):  # (n, SIZE, SIZE) => (n,) uint64
+    low = (DCT @ batch @ DCT.T)[:, :8, :8].reshape(len(batch), 64)
+    med = np.median(low[:, 1:], axis=1, keepdims=True)  # dc term left out
+    return (low > med).astype(np.uint64) @ WEIGHTS
+
+
+class Index:
+    def __init__(self, path=INDEX):
+        self.path = Path(path)
+        self.paths = []
+        self.hashes = np.zeros(0, np.uint64)
+        self.meta = np.zeros((0, 3), np.int64)  # size, mtime ns, inode
+        self.pairs = np.zeros((0, 3), np.int64)  # i, j, distance
+        if self.path.is_file():
+            with np.load(self.path) as z:
+                self.paths = z["paths"].tolist()
+                self.hashes, self.meta, self.pairs = z["hashes"], z["meta"], z["pairs"]
+
+    def save(self):
+        tmp = self.path.with_name(self.path.name + ".tmp.npz")
+        np.savez(
+            tmp,
+            paths=np.array(self.paths, dtype=str),
+            hashes=self.hashes,
+            meta=self.meta,
+            pairs=self.pairs,
+        )
+        os.replace(tmp, self.path)
+
+    def drop(self, gone):  # bool mask => rows removed, pairs renumbered
+        keep = ~gone
+        new = np.cumsum(keep) - 1
+        pairs = self.pairs[keep[self.pairs[:, 0]] & keep[self.pairs[:, 1]]]
+        self.pairs = np.column_stack([new[pairs[:, 0]], new[pairs[:, 1]], pairs[:, 2]])
+        self.paths = [p for p, k in zip(self.paths, keep) if k]
+        self.hashes, self.meta = self.hashes[keep], self.meta[keep]
+
+    def add(self, paths, hashes, meta):  # => first new row
+        start = len(self.paths)
+        self.paths += paths
+        self.hashes = np.concatenate([self.hashes, hashes])
+        self.meta = np.concatenate([self.meta, meta])
+        return start
+
+    def match(self, start, distance):
+        # rows start.. against every row before them (old + earlier new ones)
+        found = []
+        step = max(1, CELLS // max(1, len(self.hashes)))
+        for a in range(start, len(self.hashes), step):
+            b = min(a + step, len(self.hashes))
+            d = popcount(self.hashes[a:b, None] ^ self.hashes[None, :b])
+            i, j = np.nonzero(d <= distance)
+            i += a
+            ok = j < i
+            ok &= self.meta[i, 2] != self.meta[j, 2]  # cas hardlinks aren't dups
+            found.append(np.column_stack([i[ok], j[ok], d[i[ok] - a, j[ok]]]))
+        if found:
+            self.pairs = np.concatenate([self.pairs, *found])
+        return sum(len(f) for f in found)
+
+    def clusters(self):  # => [[row, ...], ...], union-find over the pairs
+        parent = np.arange(len(self.paths))
+
+        def root(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for i, j, _ in self.pairs:
+            a, b = root(i), root(j)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+        groups = {}
+        for i in np.unique(self.pairs[:, :2]):
+            groups.setdefault(root(i), []).append(int(i))
+        return list(groups.values())
+
+
+def stat(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+def scan(idx, roots):  # => new / changed files, vanished ones dropped
+    known = {p: i for i, p in enumerate(idx.paths)}
+    seen = np.zeros(len(idx.paths), bool)
+    changed = np.zeros(len(idx.paths), bool)
+    new = []
+    for root in roots:
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                if not name.lower().endswith(EXTS):
+                    continue
+                path = os.path.join(dirpath, name)
+                i = known.get(path)
+                if i is None:
+                    new.append(path)
+                    continue
+                seen[i] = True
+                if tuple(idx.meta[i, :2]) != stat(path)[:2]:
+                    changed[i] = True
+                    new.append(path)
+
+    # only rows under the scanned roots can be gone, other dumps stay as is
+    roots = tuple(os.path.join(os.path.normpath(r), "") for r in roots)
+    under = np.array([p.startswith(roots) for p in idx.paths], bool)
+    idx.drop((under & ~seen) | changed)
+    return new
+
+
+def index(idx, paths, workers):  # => first new row
+    start = len(idx.paths)
+    with ThreadPoolExecutor(workers) as pool:  # PIL decodes without the gil
+        for a in range(0, len(paths), BATCH):
+            chunk = paths[a : a + BATCH]
+            px = list(pool.map(pixels, chunk))
+            ok = [p for p, x in zip(chunk, px) if x is not None]
+            if not ok:
+                continue
+            batch = np.stack([x for x in px if x is not None])
+            idx.add(ok, hashes(batch), np.array([stat(p) for p in ok], np.int64))
+            print(f"{a + len(chunk)} / {len(paths)}", end="\r", file=sys.stderr)
+    return start
+
+
+def best(idx, rows):  # biggest file wins (resolution ~ bytes for one pic)
+    return max(rows, key=lambda i: (idx.meta[i, 0], -i))
+
+
+def keeps(idx, rows):  # => row => the copy it links to, best of its format
+    formats = {}
+    for i in rows:
+        formats.setdefault(os.path.splitext(idx.paths[i])[1].lower(), []).append(i)
+    return {i: best(idx, same) for same in formats.values() for i in same}
+
+
+def hardlink(idx, rows, distance):
+    linked = 0
+    for i, keep in keeps(idx, rows).items():
+        if idx.meta[i, 2] == idx.meta[keep, 2]:  # keep itself / linked already
+            continue
+        # clusters are transitive (a ~ b ~ c), only what is near keep itself goes
+        if popcount(idx.hashes[i] ^ idx.hashes[keep]) > distance:
+            continue
+        dst = idx.paths[i]
+        tmp = dst + ".phash"
+        os.link(idx.paths[keep], tmp)
+        os.replace(tmp, dst)
+        idx.hashes[i], idx.meta[i] = idx.hashes[keep], stat(dst)
+        linked += 1
+    return linked
+
+
+def selftest():
+    # one picture as a big png + 3 re-encoded jpgs: the png must not stop the
+    # jpgs from linking to the best jpg, and stays a file of its own
+    rng = np.random.default_rng(0)
+    base = Image.fromarray(rng.integers(0, 256, (16, 16, 3), np.uint8))
+    base = base.resize((512, 512), Image.Resampling.BICUBIC)
+    with tempfile.TemporaryDirectory(prefix="phash-") as tmp:
+        base.save(os.path.join(tmp, "a.png"))
+        for q, size in ((95, 512), (80, 384), (60, 256)):
+            base.resize((size, size)).save(os.path.join(tmp, f"q{q}.jpg"), quality=q)
+
+        idx = Index(os.path.join(tmp, "phash.npz"))
+        idx.match(index(idx, scan(idx, [tmp]), 2), DISTANCE)
+        (rows,) = idx.clusters()
+        assert len(rows) == 4, rows
+        assert hardlink(idx, rows, DISTANCE) == 2
+
+        ino = {
+            name: os.stat(os.path.join(tmp, name)).st_ino for name in os.listdir(tmp)
+        }
+        assert ino["q95.jpg"] == ino["q80.jpg"] == ino["q60.jpg"], ino
+        assert ino["a.png"] != ino["q95.jpg"], ino
+        assert os.path.getsize(os.path.join(tmp, "a.png")) > os.path.getsize(
+            os.path.join(tmp, "q95.jpg")
+        )
+    log.success("selftest ok")
+
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser(usage="%prog [options] <dir> ...")
+    parser.add_option("-i", dest="index", default=INDEX, help="index file (.npz)")
+    parser.add_option(
+        "-d", dest="distance", type=int, default=DISTANCE, help="max bits apart (of 64)"
+    )
+    parser.add_option(
+        "-l",
+        dest="link",
+        action="store_true",
+        help="hardlink clusters to the best copy",
+    )
+    parser.add_option("-j", dest="workers", type=int, default=8, help="decode threads")
+    parser.add_option("-T", dest="test", action="store_true", help="self-test, exit")
+    options, arguments = parser.parse_args()
+
+    if options.test:
+        selftest()
+        sys.exit()
+
+    if not arguments:
+        parser.print_usage()
+        sys.exit()
+
+    idx = Index(options.index)
+    new = scan(idx, arguments)
+    log.info(f"{len(idx.paths)} indexed, {len(new)} new")
+
+    start = index(idx, new, options.workers)
+    found = idx.match(start, options.distance)
+    log.info(f"{found} new pairs")
+
+    linked = 0
+    for rows in sorted(idx.clusters(), key=len, reverse=True):
+        kept = keeps(idx, rows)
+        print(f"\n{len(rows)} pics, best {idx.paths[best(idx, rows)]}")
+        for i in rows:
+            keep = kept[i]
+            d = popcount(idx.hashes[i] ^ idx.hashes[keep])  # to best of its format
+            if idx.meta[i, 2] == idx.meta[keep, 2]:
+                mark = "="  # hardlinked
+            elif d > options.distance:
+                mark = ">"  # only near via others, never linked
+            else:
+                mark = " "
+            print(f"  {d:>2}{mark}{idx.meta[i, 0]:>10} {idx.paths[i]}")
+        if options.link:
+            linked += hardlink(idx, rows, options.distance)
+
+    if options.link:
+        log.info(f"{linked} hardlinked")
+    idx.save()
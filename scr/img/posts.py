@@ -0,0 +1,269 @@
+#!/usr/bin/env -S uv run --script
+
+# /// script
+# dependencies = [
+#   "loguru",
+# ]
+# ///
+
+# post metadata of the dumped threads in one sqlite db: every <thread>.json
+# vichan.py / lynxchan.py saved (loose or inside crawl.py -a tars) => posts +
+# files tables, fts5 over subject / comment. re-runs only read json whose
+# mtime / size (or tar member offset) changed, a grown thread is replaced whole
+#
+#   posts.py dumps/ gallery-dl/               ingest
+#   posts.py -q 'touhou NOT cirno'            posts matching (fts5 syntax)
+#   posts.py -T '!Ep8pui8Vw2'                 every file posted by a tripcode
+#   posts.py -m 'GBfYwENYAaBg1C9aoow58A=='    where a file (vichan md5) was posted
+
+import html
+import json
+import optparse
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime
+
+from loguru import logger as log
+
+import pack
+
+DB = "posts.db"
+COMMIT_EVERY = 500  # json files per transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY, kind TEXT, mtime INTEGER, size INTEGER
+);
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY, source TEXT, thread INTEGER, no INTEGER, time INTEGER,
+    name TEXT, trip TEXT, sub TEXT, com TEXT,
+    UNIQUE (source, no)
+);
+CREATE TABLE IF NOT EXISTS files (
+    source TEXT, no INTEGER, tim TEXT, filename TEXT, md5 TEXT, path TEXT
+);
+CREATE INDEX IF NOT EXISTS posts_thread ON posts (thread);
+CREATE INDEX IF NOT EXISTS posts_trip ON posts (trip);
+CREATE INDEX IF NOT EXISTS files_source ON files (source, no);
+CREATE INDEX IF NOT EXISTS files_md5 ON files (md5);
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5 (
+    sub, com, content='posts', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS posts_ai AFTER INSERT ON posts BEGIN
+    INSERT INTO posts_fts (rowid, sub, com) VALUES (new.id, new.sub, new.com);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_ad AFTER DELETE ON posts BEGIN
+    INSERT INTO posts_fts (posts_fts, rowid, sub, com)
+    VALUES ('delete', old.id, old.sub, old.com);
+END;
+"""
+
+
+def text(com):  # vichan comment html => plain text for fts
+    if not com:
+        return ""
+    com = re.sub(r"<br\s*/?>", "\n", com)
+    return html.unescape(re.sub(r"<[^>]+>", "", com))
+
+
+def unix(creation):  # lynxchan "2024-08-30T12:34:56.789Z" => unix time
+    try:
+        return int(datetime.fromisoformat(creation.replace("Z", "+00:00")).timestamp())
+    except (AttributeError, ValueError):
+        return None
+
+
+def vichan(th):  # => posts, files
+    posts, files = [], []
+    op = th["posts"][0]["no"]
+    for p in th["posts"]:
+        posts.append(
+            (op, p["no"], p.get("time"), p.get("name"), p.get("trip"))
+            + (p.get("sub"), text(p.get("com")))
+        )
+        for f in [p, *p.get("extra_files", [])]:
+            if "filename" in f:
+                name = f"{f['filename']}{f.get('ext', '')}"
+                files.append((p["no"], str(f.get("tim")), name, f.get("md5"), None))
+    return posts, files
+
+
+def lynxchan(th):
+    posts, files = [], []
+    op = th["threadId"]
+    for p in [th, *th.get("posts", [])]:
+        no = p.get("postId", op)
+        name = p.get("name") or ""
+        trip = name[name.index("!") :] if "!" in name else None  # "anon !tripcode"
+        posts.append(
+            (op, no, unix(p.get("creation")), name, trip)
+            + (p.get("subject"), p.get("message") or "")
+        )
+        for f in p.get("files") or []:
+            files.append((no, None, f.get("originalName"), None, f.get("path")))
+    return posts, files
+
+
+def parse(data):  # => kind, posts, files | None for json that isn't a thread
+    try:
+        th = json.loads(data)
+    except ValueError:
+        return None
+    if isinstance(th, dict) and th.get("posts") and "no" in th["posts"][0]:
+        return "vichan", *vichan(th)
+    if isinstance(th, dict) and "threadId" in th:
+        return "lynxchan", *lynxchan(th)
+    return None
+
+
+class Store:
+    def __init__(self, path=DB):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.seen = dict(
+            (s, (m, n))
+            for s, m, n in self.db.execute("SELECT source, mtime, size FROM sources")
+        )
+        self.pending = 0
+
+    def changed(self, source, mtime, size):
+        return self.seen.get(source) != (mtime, size)
+
+    def put(self, source, mtime, size, data):  # => posts added | None
+        thread = parse(data)
+        if thread is None:  # stats.json & co, remembered so it's not re-read
+            thread = None, [], []
+        kind, posts, files = thread
+
+        # grown thread => replaced whole, the delete trigger keeps fts in step
+        self.db.execute("DELETE FROM posts WHERE source = ?", (source,))
+        self.db.execute("DELETE FROM files WHERE source = ?", (source,))
+        self.db.executemany(
+            "INSERT OR REPLACE INTO posts "
+            "(source, thread, no, time, name, trip, sub, com) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(source, *p) for p in posts],
+        )
+        self.db.executemany(
+            "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)",
+            [(source, *f) for f in files],
+        )
+        self.db.execute(
+            "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+            (source, kind, mtime, size),
+        )
+        self.seen[source] = (mtime, size)
+
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.commit()
+        return len(posts) if kind else None
+
+    def commit(self):
+        self.db.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.db.close()
+
+
+def ingest(store, roots):  # => json files read, posts added
+    read = added = 0
+    for root in roots:
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+
+                if name.endswith(".json"):
+                    st = os.stat(path)
+                    if not store.changed(path, st.st_mtime_ns, st.st_size):
+                        continue
+                    with open(path, "rb") as f:
+                        n = store.put(path, st.st_mtime_ns, st.st_size, f.read())
+
+                elif name.endswith(".tar") and os.path.isfile(path + ".idx"):
+                    # crawl.py -a: members are appended, offset moves on change
+                    n = None
+                    a = pack.Archive(path)
+                    for e in a.members.values():
+                        source, key = f"{path}/{e['name']}", (e["offset"], e["size"])
+                        if e["name"].endswith(".json") and store.changed(source, *key):
+                            n = (n or 0) + (
+                                store.put(source, *key, a.read(e["name"])) or 0
+                            )
+                else:
+                    continue
+
+                if n is not None:
+                    read += 1
+                    added += n
+                    print(f"{read} threads, {added} posts", end="\r", file=sys.stderr)
+    store.commit()
+    return read, added
+
+
+def search(store, query, limit):
+    q = """
+    SELECT p.source, p.thread, p.no, p.time, p.trip,
+           snippet(posts_fts, -1, '[', ']', '...', 12)
+    FROM posts_fts JOIN posts p ON p.id = posts_fts.rowid
+    WHERE posts_fts MATCH ? ORDER BY rank LIMIT ?
+    """
+    return store.db.execute(q, (query, limit)).fetchall()
+
+
+def by_trip(store, trip, limit):
+    q = """
+    SELECT p.source, p.thread, p.no, p.time, f.filename, f.md5
+    FROM posts p JOIN files f ON f.source = p.source AND f.no = p.no
+    WHERE p.trip = ? ORDER BY p.time LIMIT ?
+    """
+    return store.db.execute(q, (trip, limit)).fetchall()
+
+
+def by_md5(store, md5, limit):
+    q = """
+    SELECT f.source, p.thread, f.no, p.time, f.filename, p.trip
+    FROM files f JOIN posts p ON p.source = f.source AND p.no = f.no
+    WHERE f.md5 = ? ORDER BY p.time LIMIT ?
+    """
+    return store.db.execute(q, (md5, limit)).fetchall()
+
+
+if __name__ == "__main__":
+    parser = optparse.OptionParser(usage="%prog [options] [<dump dir> ...]")
+    parser.add_option("-d", dest="db", default=DB, help="sqlite db")
+    parser.add_option("-q", dest="query", default=None, help="fts5 query")
+    parser.add_option("-T", dest="trip", default=None, help="files by tripcode")
+    parser.add_option("-m", dest="md5", default=None, help="posts of a file (md5)")
+    parser.add_option("-n", dest="limit", type=int, default=50, help="max rows")
+    options, arguments = parser.parse_args()
+
+    if not (arguments or options.query or options.trip or options.md5):
+        parser.print_usage()
+        sys.exit()
+
+    store = Store(options.db)
+
+    if arguments:
+        read, added = ingest(store, arguments)
+        log.info(f"{read} new / changed threads, {added} posts")
+
+    rows = []
+    if options.query:
+        rows += search(store, options.query, options.limit)
+    if options.trip:
+        rows += by_trip(store, options.trip, options.limit)
+    if options.md5:
+        rows += by_md5(store, options.md5, options.limit)
+    for source, thread, no, t, *rest in rows:
+        when = datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M") if t else "?"
+        print(f"{thread:>9} {no:>9} {when} {source}")
+        print("   ", " | ".join(str(x) for x in rest if x is not None))
+
+    store.close()
@@ -0,0 +1,153 @@
+# per-host token bucket (requests/sec + burst) shared by every fetch of a run
+# hosts don't wait on each other, 429/503 halves the host rate (Retry-After
+# honoured), every ok response wins a bit of it back up to the set rate
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import httpx
+from loguru import logger as log
+
+import net
+import stats
+
+TRIES = 5
+CHUNK = 1 << 16
+
+
+class Bucket:
+    def __init__(self, rate, burst):
+        self.max_rate = self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.blocked_until = 0.0
+
+    def take(self):  # => seconds to wait, 0 if token taken
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class Limiter:
+    def __init__(self, rate=2.0, burst=4, min_rate=0.05):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def _bucket(self, url):
+        host = urlparse(url).hostname
+        if host not in self.buckets:
+            self.buckets[host] = Bucket(self.rate, self.burst)
+        return self.buckets[host]
+
+    def wait(self, url):
+        while True:
+            with self.lock:
+                delay = self._bucket(url).take()
+            if not delay:
+                return
+            stats.add(
+                "ratelimit_wait_seconds_total", delay, host=urlparse(url).hostname
+            )
+            time.sleep(delay)
+
+    async def acquire(self, url):  # wait() for asyncio callers
+        while True:
+            with self.lock:
+                delay = self._bucket(url).take()
+            if not delay:
+                return
+            stats.add(
+                "ratelimit_wait_seconds_total", delay, host=urlparse(url).hostname
+            )
+            await asyncio.sleep(delay)
+
+    def feedback(self, url, r):
+        with self.lock:
+            b = self._bucket(url)
+            if r.status_code in (429, 503):
+                b.rate = max(self.min_rate, b.rate / 2)
+                b.tokens = 0
+                b.blocked_until = time.monotonic() + net.retry_after(r, 1 / b.rate)
+                log.warning(
+                    f"{urlparse(url).hostname}: {r.status_code}, {b.rate:.2f} rps"
+                )
+            elif b.rate < b.max_rate:
+                b.rate = min(b.max_rate, b.rate + b.max_rate / 20)
+
+    def get(self, url, **kwargs):
+        # 429/503 => back off and retry, anything else goes back to the caller
+        for attempt in range(TRIES):
+            self.wait(url)
+            try:
+                r = net.client().get(url, **kwargs)
+            except httpx.TransportError as e:
+                if attempt == TRIES - 1:
+                    raise
+                log.warning(f"{url} => {e!r}")
+                time.sleep(net.backoff(attempt))
+                continue
+            self.feedback(url, r)
+            if r.status_code not in (429, 503):
+                return r
+        return r
+
+    def download(self, url, path):  # wget -nc
+        path = str(path)
+        if os.path.exists(path):
+            return False
+
+        part = path + ".part"
+        for attempt in range(TRIES):
+            self.wait(url)
+            try:
+                with net.client().stream("GET", url) as r:
+                    self.feedback(url, r)
+                    if r.status_code in net.RETRY:
+                        log.warning(f"{url} => {r.status_code}")
+                        time.sleep(net.backoff(attempt, r))
+                        continue
+                    r.raise_for_status()
+                    with open(part, "wb") as f:
+                        for chunk in r.iter_bytes(CHUNK):
+                            f.write(chunk)
+                break
+            except httpx.TransportError as e:
+                if attempt == TRIES - 1:
+                    raise
+                log.warning(f"{url} => {e!r}")
+                time.sleep(net.backoff(attempt))
+        else:
+            raise OSError(f"failed {url} after {TRIES} tries")
+
+        os.replace(part, path)
+        ts = net.mtime(r.headers)
+        if ts is not None:
+            os.utime(path, (ts, ts))
+        return True
+
+    def download_all(self, urls, out_dir=".", workers=4):
+        # urls => out_dir/<basename>, returns how many were new
+        def one(url):
+            try:
+                return self.download(url, os.path.join(out_dir, os.path.basename(url)))
+            except (httpx.HTTPError, OSError) as e:
+                log.error(f"{url} => {e!r}")
+                return False
+
+        with ThreadPoolExecutor(workers) as pool:
+            return sum(pool.map(one, urls))
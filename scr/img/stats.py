@@ -0,0 +1,215 @@
+# run counters / timers for the scrappers: requests, bytes, per-host latency
+# histograms, per-stage timings, queue depths. net.py feeds every http
+# request in, the rest is timed where it happens (links parse, crawl stages,
+# adl media, aria2c startup)
+#
+#   STATS_EVERY=10          one summary line on stderr every 10 seconds
+#   STATS_OUT=run.json      dump at exit, json (.json) or prometheus text (else)
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+EVERY = float(os.environ.get("STATS_EVERY", 0) or 0)
+OUT = os.environ.get("STATS_OUT", "")
+PREFIX = "scr_"
+
+# seconds, prometheus style upper bounds (+Inf implied)
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+lock = threading.Lock()
+counters = {}  # (name, labels) => value
+histograms = {}  # (name, labels) => [bucket counts..., +Inf], sum
+gauges = {}  # name => fn() => value, sampled on report
+started = time.time()
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def add(name, value=1, **labels):
+    k = _key(name, labels)
+    with lock:
+        counters[k] = counters.get(k, 0) + value
+
+
+def observe(name, seconds, **labels):
+    k = _key(name, labels)
+    with lock:
+        if k not in histograms:
+            histograms[k] = [[0] * (len(BUCKETS) + 1), 0.0]
+        h = histograms[k]
+        for i, le in enumerate(BUCKETS):
+            if seconds <= le:
+                h[0][i] += 1
+                break
+        else:
+            h[0][-1] += 1
+        h[1] += seconds
+
+
+@contextmanager
+def timer(name, **labels):  # with stats.timer("parse", backend="lxml"): ...
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(f"{name}_seconds", time.perf_counter() - t, **labels)
+
+
+def gauge(name, fn):
+    gauges[name] = fn
+
+
+def _total(name):
+    return sum(v for (n, _), v in counters.items() if n == name)
+
+
+def _hist(name):  # all label sets merged => counts, sum
+    counts, total = [0] * (len(BUCKETS) + 1), 0.0
+    for (n, _), (c, s) in histograms.items():
+        if n == name:
+            counts = [a + b for a, b in zip(counts, c)]
+            total += s
+    return counts, total
+
+
+def quantile(counts, q):  # bucket upper bound the q-th observation falls in
+    n = sum(counts)
+    if not n:
+        return 0.0
+    seen = 0
+    for le, c in zip(BUCKETS + (float("inf"),), counts):
+        seen += c
+        if seen >= q * n:
+            return le
+    return float("inf")
+
+
+def summary():
+    with lock:
+        elapsed = time.time() - started
+        req = _total("http_requests_total")
+        errors = sum(
+            v
+            for (n, labels), v in counters.items()
+            if n == "http_requests_total" and dict(labels).get("status", "0") >= "400"
+        )
+        mb = _total("http_bytes_total") / 1024 / 1024
+        ttfb, _ = _hist("http_ttfb_seconds")
+        parse, parse_sum = _hist("parse_seconds")
+
+    line = (
+        f"stats: {elapsed:.0f}s, {req:.0f} req ({errors:.0f} err), "
+        f"{mb:.1f} MB ({mb / max(elapsed, 1e-9):.2f} MB/s), "
+        f"ttfb p50 <={quantile(ttfb, 0.5)}s p95 <={quantile(ttfb, 0.95)}s, "
+        f"parse {sum(parse)} pages {parse_sum:.2f}s"
+    )
+    depths = []
+    for name, fn in list(gauges.items()):
+        try:
+            depths.append(f"{name}={fn()}")
+        except Exception:
+            pass
+    if depths:
+        line += ", " + " ".join(depths)
+    return line
+
+
+def snapshot():
+    with lock:
+        return {
+            "started": started,
+            "elapsed": time.time() - started,
+            "counters": [
+                {"name": n, "labels": dict(labels), "value": v}
+                for (n, labels), v in counters.items()
+            ],
+            "histograms": [
+                {
+                    "name": n,
+                    "labels": dict(labels),
+                    "buckets": dict(zip(map(str, BUCKETS + ("+Inf",)), c)),
+                    "sum": s,
+                    "count": sum(c),
+                }
+                for (n, labels), (c, s) in histograms.items()
+            ],
+            "gauges": {n: _sample(fn) for n, fn in list(gauges.items())},
+        }
+
+
+def _sample(fn):
+    try:
+        return fn()
+    except Exception:
+        return None
+
+
+def _labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def prometheus():
+    snap = snapshot()
+    lines = []
+    for name in sorted({c["name"] for c in snap["counters"]}):
+        lines.append(f"# TYPE {PREFIX}{name} counter")
+        for c in snap["counters"]:
+            if c["name"] == name:
+                labels = _labels(c["labels"].items())
+                lines.append(f"{PREFIX}{name}{labels} {c['value']}")
+
+    for name in sorted({h["name"] for h in snap["histograms"]}):
+        lines.append(f"# TYPE {PREFIX}{name} histogram")
+        for h in snap["histograms"]:
+            if h["name"] != name:
+                continue
+            seen = 0
+            for le, c in h["buckets"].items():  # prometheus buckets are cumulative
+                seen += c
+                labels = _labels(h["labels"].items(), [("le", le)])
+                lines.append(f"{PREFIX}{name}_bucket{labels} {seen}")
+            labels = _labels(h["labels"].items())
+            lines.append(f"{PREFIX}{name}_sum{labels} {h['sum']}")
+            lines.append(f"{PREFIX}{name}_count{labels} {h['count']}")
+
+    for name, value in snap["gauges"].items():
+        if value is not None:
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            lines.append(f"{PREFIX}{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def dump(path):
+    path = str(path)
+    if path.endswith(".json"):
+        text = json.dumps(snapshot(), indent=1)
+    else:
+        text = prometheus()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _report(every):
+    while True:
+        time.sleep(every)
+        print(summary(), file=sys.stderr, flush=True)
+
+
+def start(every=EVERY, out=OUT):
+    # called once from a scrapper's main, both optional
+    if every:
+        threading.Thread(target=_report, args=(every,), daemon=True).start()
+    if out:
+        atexit.register(dump, out)
+    atexit.register(lambda: print(summary(), file=sys.stderr, flush=True))
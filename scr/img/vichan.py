@@ -2,155 +2,132 @@
 
 # /// script
 # dependencies = [
-#   "requests",
-#   "bs4",
+#   "httpx",
 #   "loguru",
 # ]
 # ///
 
-import requests
+import base64
+import binascii
 import os
-import subprocess
-import sys
-import re
-import pathlib
-import random
-import string
 from loguru import logger as log
 
-MAIN_URL = None  # https://wapchan.org/cel
-ARIA2_FILENAME = (
-    "".join(random.choice(string.ascii_letters) for x in range(10)) + ".txt"
-)
+import crawl
 
-log.remove(0)
-log.add(
-    sys.stderr,
-    format="<level>[{time:DD-MMM-YYYY HH:mm:ss}]</level> {message}",
-    backtrace=True,
-    diagnose=True,
-    colorize=True,
-    level=5,
-)
-log.add(
-    "log.txt",
-    format="[{time:DD-MMM-YYYY HH:mm:ss}] {message}",
-    backtrace=True,
-    diagnose=True,
-    colorize=True,
-    level=5,
-)
-
-
-def fileDel(filename):
-    rem_file = pathlib.Path(filename)
-    rem_file.unlink(missing_ok=True)
-
-
-def add(dir, bin):
-    with open(dir, "a", encoding="utf-8") as file:
-        file.write(bin + "\n")
-
-
-def str_cut(string, letters, postfix="..."):
-    return string[:letters] + (string[letters:] and postfix)
-
-
-def str_fix(string):
-    return str_cut(re.sub(r'[/\\?%*:{}【】|"<>]', "", string), 200, "")
-
-
-def dump_thread(th_url):
-    global MAIN_URL
-    images = []
-
-    r = requests.get(th_url)
 
+def md5_hex(md5):  # "GBfYwENYAaBg1C9aoow58A==" => "1817d8c1...", bad / none => None
     try:
-        r = r.json()["posts"]
-    except:
-        log.error(th_url)
-        return
-
-    dirname = str(r[0]["no"])
-    if "sub" in r[0]:
-        dirname += " " + str_fix(r[0]["sub"])
-
-    for post in r:
-        if "filename" not in post:
-            continue
-
-        f = f"{post['tim']} {post['filename']}{post['ext']}"  #  1725081265298 mpv-shot0001.jpg
-        u = f"{MAIN_URL}/src/{post['tim']}{post['ext']}"  # https://wapchan.org/cel/src/1724962488992.jpg
-        images.append([f, u])
-
-    if not images:
-        log.debug(f"{th_url} (no images)")
-        return
-
-    fileDel(ARIA2_FILENAME)
-
-    for img in images:
-        if img[1].endswith("deleted"):
-            continue
-
-        add(ARIA2_FILENAME, f"{img[1]}\n    out={img[0]}")
-    add(ARIA2_FILENAME, f"{th_url}\n    out={dirname}.json")
-
-    # dirname = 'kissu' + '/' + 'maho' + '/' + dirname
-
-    aria2c_args = [
-        "aria2c",
-        f"--input-file={ARIA2_FILENAME}",
-        f"--dir={dirname}",
-        "--max-connection-per-server=1",
-        "--max-concurrent-downloads=1",
-        "--auto-file-renaming=false",
-        "--remote-time=true",
-        "--log-level=error",
-        "--console-log-level=error",
-        "--download-result=hide",
-        "--summary-interval=0",
-        "--file-allocation=none",
-        #'--all-proxy=http://127.0.0.1:10809'
-    ]
-
-    log.debug(th_url)
-    subprocess.run(aria2c_args)
-    print("", end="\r", flush=True)
-    fileDel(ARIA2_FILENAME)
-    return
-
-
-def dump(url, _from, _to):
-    global MAIN_URL
-    if "htm" in url:  # https://wapchan.org/cel/index.html
-        url = os.path.dirname(url)  # https://wapchan.org/cel
-    MAIN_URL = url
-    log.info(MAIN_URL)
-
-    _range = [x for x in range(_from, _to + 1)]
-
-    u = MAIN_URL + "/catalog.json"  # https://wapchan.org/cel/catalog.json
-    r = requests.get(u).json()
-
-    for page in r:
-        page_num = page["page"]
-        if page_num not in _range:
-            continue
-
-        log.trace(f"page {page_num} of {len(r) - 1}")
-        for th in page["threads"]:
-            th_url = f"{MAIN_URL}/res/{th['no']}.json"  # https://wapchan.org/cel/res/2788.json
-            dump_thread(th_url)
-
-
-if len(sys.argv) < 3:
-    print(sys.argv[0], "startpage-endpage <link to board>")
-    print(sys.argv[0], "0-5 https://wapchan.org/cel")
-    sys.exit()
-
-_from, _to = sys.argv[1].split("-")
-
-for i in range(2, len(sys.argv)):
-    dump(sys.argv[i], int(_from), int(_to))
+        digest = base64.b64decode(md5 or "", validate=True)
+    except binascii.Error:
+        return None
+    return digest.hex() if len(digest) == 16 else None
+
+
+class Site:  # crawl.py adapter
+    def __init__(self, url, _from, _to):
+        if "htm" in url:  # https://wapchan.org/cel/index.html
+            url = os.path.dirname(url)  # https://wapchan.org/cel
+        self.url = url
+        self.range = range(_from, _to + 1)
+
+    async def threads(self, c):
+        log.info(self.url)
+        unchanged = 0
+
+        u = self.url + "/catalog.json"  # https://wapchan.org/cel/catalog.json
+        r = (await c.get(u)).json()
+
+        for page in r:
+            page_num = page["page"]
+            if page_num not in self.range:
+                continue
+
+            log.trace(f"page {page_num} of {len(r) - 1}")
+            for th in page["threads"]:
+                # bump state from catalog, unchanged => nothing new in the thread
+                state = (th.get("last_modified"), th.get("replies"), th.get("images"))
+                if c.options.incremental:
+                    if not c.index.thread_changed(self.url, th["no"], state):
+                        unchanged += 1
+                        continue
+
+                yield th["no"], state
+
+        if c.options.incremental:
+            log.trace(f"{unchanged} unchanged threads skipped")
+
+    def posts(self, th):  # daemon.py => (thread, posts in it) from the catalog
+        no, state = th
+        return no, (state[1] or 0) + 1
+
+    async def dump_thread(self, c, th):
+        no, state = th
+        th_url = f"{self.url}/res/{no}.json"  # https://wapchan.org/cel/res/2788.json
+        images = []
+
+        on_thread_done = None
+        if c.options.incremental:
+            on_thread_done = lambda: c.index.thread_done(self.url, no, state)
+
+        r = await c.get(th_url)
+
+        try:
+            posts = r.json()["posts"]
+        except:
+            log.error(th_url)
+            return
+
+        dirname = str(posts[0]["no"])
+        if "sub" in posts[0]:
+            dirname += " " + crawl.str_fix(posts[0]["sub"])
+
+        for post in posts:
+            if "filename" not in post:
+                continue
+
+            f = f"{post['tim']} {post['filename']}{post['ext']}"  #  1725081265298 mpv-shot0001.jpg
+            u = f"{self.url}/src/{post['tim']}{post['ext']}"  # https://wapchan.org/cel/src/1724962488992.jpg
+            key = (
+                "vichan",
+                self.url,
+                post["no"],
+                str(post["tim"]),
+                post.get("md5", ""),
+            )
+            images.append([f, u, key])
+
+        # dirname = 'kissu' + '/' + 'maho' + '/' + dirname
+
+        # text-only threads too, posts.py indexes the json
+        c.save(os.path.join(dirname, f"{dirname}.json"), r)
+
+        if not images:
+            log.debug(f"{th_url} (no images)")
+            if on_thread_done:
+                on_thread_done()
+            return
+
+        log.debug(th_url)
+
+        files = []
+        for f, u, key in images:
+            if u.endswith("deleted"):
+                continue
+            blob = None
+            if c.store and key[4]:
+                blob = c.store.vichan(key[4], os.path.splitext(u)[1])
+            files.append(
+                {
+                    "url": u,
+                    "out": os.path.join(dirname, f),
+                    "key": key,
+                    "blob": blob,
+                    "md5": md5_hex(key[4]),  # checked while downloading
+                }
+            )
+
+        await c.put_thread(files, on_thread_done)
+
+
+if __name__ == "__main__":
+    crawl.main(Site, "0-5 https://wapchan.org/cel")
@@ -16,19 +16,18 @@ import time
 import sys
 import os
 import re
-import pathlib
 import optparse
 import random
-import string
-import shutil
 import asyncio
-import subprocess as sp
 from datetime import datetime
 
 import pause
 from twikit import Client
 from loguru import logger as log
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "img"))
+import aria2rpc
+
 trace, info, err, succ = (log.trace, log.info, log.error, log.success)
 
 # import tracemalloc; tracemalloc.start()
@@ -64,55 +63,18 @@ parser.add_option(
 )
 options, arguments = parser.parse_args()
 
-ARIA2_FILENAME = (
-    "".join(random.choice(string.ascii_letters) for x in range(10)) + ".txt"
-)
-aria2c_args = [
-    "aria2c",
-    f"--input-file={ARIA2_FILENAME}",
-    f"--dir={options.search}",
-    "--max-connection-per-server=1",
-    "--max-concurrent-downloads=2",
-    "--auto-file-renaming=false",
-    "--remote-time=true",
-    "--log-level=error",
-    "--console-log-level=error",
-    "--download-result=hide",
-    "--summary-interval=0",
-    "--file-allocation=none",
-    "--continue=true",
-    "--check-certificate=false",
-    "--quiet=true",
-]
-if options.proxy:
-    aria2c_args.append(f"--all-proxy={options.proxy}")
-
-
-def fileDel(filename):
-    rem_file = pathlib.Path(filename)
-    rem_file.unlink(missing_ok=True)
-
-
-def add(dir, bin):
-    with open(dir, "a", encoding="utf-8") as file:
-        file.write(bin + "\n")
+# one aria2c daemon for every search, see img/aria2rpc.py
+ARIA2_OPTIONS = {
+    "max-connection-per-server": 1,
+    "max-concurrent-downloads": 2,
+    "check-certificate": "false",
+}
 
 
 def con(d, c):
     return any(k in str(c) for k in d)
 
 
-def is_aria2c_available():
-    if shutil.which("aria2c") is None:
-        return False
-
-    try:
-        r = sp.run(["aria2c", "--version"], capture_output=True, text=True, check=True)
-        return "aria2" in r.stdout.lower()
-    except (sp.CalledProcessError, FileNotFoundError):
-        return False
-
-
 def picsdump(tweets):
     medias = []
     dubs = 0
@@ -159,14 +121,8 @@ def picsdump(tweets):
     if not medias:
         return ""  # only dubs
 
-    fileDel(ARIA2_FILENAME)
-
-    for med in medias:
-        add(ARIA2_FILENAME, "%s\n    out=%s" % (med[0], med[1]))
-
-    sp.run(aria2c_args, capture_output=False, text=False)
-
-    fileDel(ARIA2_FILENAME)
+    for med in medias:  # queued, aria2 downloads while the next search runs
+        ARIA2.add(med[0], options.search, med[1])
 
     ret = "+%s" % len(medias)
     if dubs:
@@ -260,7 +216,7 @@ stop = False
 all_urls = []
 all_ids = []
 
-if not is_aria2c_available():
+if not aria2rpc.available():
     err("need aria2 downloader to working")
     sys.exit(1)
 
@@ -275,6 +231,8 @@ else:
     client.load_cookies(COOKIES)
     info("cookies ok!")
 
+ARIA2 = aria2rpc.Aria2(ARIA2_OPTIONS, options.proxy)
+
 
 # "1-5,8,10-12" => 1,2,3,4,5,8,10,11,12
 def expand_ranges(s):
@@ -320,4 +278,6 @@ for y in years:
             if datetime(int(f"20{y}"), int(m), int(d)) > datetime.now():
                 stop = True
 
+ARIA2.join()
+ARIA2.close()
 info(f"all_urls => {len(all_urls)}")